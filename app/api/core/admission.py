@@ -0,0 +1,89 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from langchain_core.runnables import RunnableConfig
+from app.api.core.config import max_concurrent_interviews, max_interviews_per_thread, max_queued_interviews
+
+# Admission control for interviews (the conduct_interview fan-out), per worker process.
+# Every analyst becomes a Send("conduct_interview", ...) and LangGraph starts them all at once. Each
+# interview first takes a slot of its own thread (at most `max_interviews_per_thread` at a time, the rest
+# queue), then a global slot (at most `max_concurrent_interviews` at a time, FIFO). One large request can
+# therefore never hold more than its per-thread share of the global slots, and new research is turned
+# away with 503 + Retry-After once too many interviews are already waiting.
+
+
+class AdmissionRejectedError(RuntimeError):
+    """Raised when new research is not accepted because the system is saturated."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InterviewAdmission:
+    def __init__(self, max_concurrent: int = max_concurrent_interviews, per_thread: int = max_interviews_per_thread,
+                 max_queued: int = max_queued_interviews):
+        self.max_concurrent = max_concurrent
+        self.per_thread = per_thread
+        self.max_queued = max_queued
+        self.running = 0
+        self.waiting = 0 # Interviews dispatched but not yet running (per-thread or global queue)
+        self.average_seconds = 60.0 # Moving average of interview duration, for Retry-After
+        self._global: Optional[asyncio.Semaphore] = None # Created lazily, inside the running event loop
+        self._threads: Dict[str, list] = {} # thread_id -> [semaphore, interviews using or waiting for it]
+
+    def _get_global(self) -> asyncio.Semaphore:
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrent)
+        return self._global
+
+    @asynccontextmanager
+    async def interview_slot(self, thread_id: str) -> AsyncIterator[None]:
+        entry = self._threads.setdefault(thread_id, [asyncio.Semaphore(self.per_thread), 0])
+        entry[1] += 1
+        self.waiting += 1
+        waiting = True
+        try:
+            async with entry[0], self._get_global():
+                self.waiting -= 1
+                waiting = False
+                self.running += 1
+                start = time.monotonic()
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+                    self.average_seconds = 0.8 * self.average_seconds + 0.2 * (time.monotonic() - start)
+        finally:
+            if waiting: # Cancelled while queued
+                self.waiting -= 1
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._threads[thread_id]
+
+    def retry_after_seconds(self) -> int:
+        # Roughly when the current backlog will have started, given the average interview duration
+        waves = (self.waiting + 1) / max(1, self.max_concurrent)
+        return max(1, min(300, math.ceil(waves * self.average_seconds)))
+
+    def check_admission(self) -> None:
+        """Raises AdmissionRejectedError if too many interviews are already waiting for a slot."""
+        if self.max_queued > 0 and self.waiting >= self.max_queued:
+            raise AdmissionRejectedError(
+                f"Server is busy ({self.waiting} interviews waiting). Please retry later.",
+                retry_after=self.retry_after_seconds(),
+            )
+
+interview_admission = InterviewAdmission()
+
+
+def admitted_interview(node: Callable[[Any, RunnableConfig], Any]) -> Callable:
+    """Wraps the conduct_interview node (a (state, config) callable) so each run waits for its slots first."""
+    async def run(state: Any, config: RunnableConfig) -> dict:
+        thread_id = str(((config or {}).get("configurable") or {}).get("thread_id", ""))
+        async with interview_admission.interview_slot(thread_id):
+            return await node(state, config)
+    run.__name__ = getattr(node, "__name__", "conduct_interview")
+    return run
@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from langchain_core._api import suppress_langchain_beta_warning
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from app.api.core.config import (
+    search_cache_enabled, search_cache_path, search_cache_ttl_seconds,
+    search_cache_memory_entries, search_cache_disk_entries,
+    llm_cache_path, llm_cache_memory_entries, llm_cache_disk_entries, llm_cache_ttl_seconds
+)
+
+_MISSING = object()
+
+def record_cache_hit(cache_name: str) -> None:
+    # Imported late: config.py builds the LLM cache while it is still loading, and tracing.py imports config
+    from app.api.core.tracing import record_cache_hit as record
+    record(cache_name)
+
+
+class MemoryLRU:
+    """In-process LRU with per-entry TTL. Not thread-safe; only used from the event loop."""
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str, default: Any = _MISSING) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        stored_at, value = entry
+        if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        self._data[key] = (stored_at if stored_at is not None else time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """SQLite key/value table with TTL and LRU eviction (by last access) once `max_entries` is exceeded.
+
+    Values are stored as text; callers decide the encoding.
+    """
+
+    def __init__(self, path: str, table: str, max_entries: int, ttl_seconds: Optional[float] = None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock:
+            self.conn.executescript(
+                f"""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_{table}_accessed_at ON {table} (accessed_at);
+                """
+            )
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        """Returns (stored_at, value) or None."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if self.ttl_seconds is not None and now - stored_at > self.ttl_seconds:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        return stored_at, value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # Trim least recently accessed rows beyond the cap
+            self.conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.conn.commit()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table}")
+            self.conn.commit()
+
+
+class TieredCache:
+    """Memory LRU in front of a DiskCache, with hit/miss counters and coalescing of concurrent misses.
+
+    Values must be JSON-serializable.
+    """
+
+    def __init__(self, name: str, memory: MemoryLRU, disk: Optional[DiskCache] = None):
+        self.name = name
+        self.memory = memory
+        self.disk = disk
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "coalesced": 0, "misses": 0}
+        self._in_flight: Dict[str, "asyncio.Future[Any]"] = {}
+
+    async def aget(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is not _MISSING:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.disk is not None:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            if entry is not None:
+                stored_at, raw = entry
+                value = json.loads(raw)
+                self.memory.set(key, value, stored_at=stored_at) # Keep the original age so the TTL still holds
+                self.stats["disk_hits"] += 1
+                return value
+        return _MISSING
+
+    async def aset(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, json.dumps(value))
+
+    async def aget_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], should_cache: Callable[[Any], bool] = lambda value: True) -> Any:
+        value = await self.aget(key)
+        if value is not _MISSING:
+            record_cache_hit(self.name)
+            return value
+        # Identical queries issued at the same time (e.g. by parallel analysts) share one fetch
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            self.stats["coalesced"] += 1
+            record_cache_hit(self.name)
+            await asyncio.wait({shared}) # Unlike awaiting it, cancelling this caller does not cancel the shared fetch
+            if not shared.cancelled():
+                return shared.result()
+            # The fetch we were waiting on was cancelled by its owner, fall through and fetch ourselves
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await fetch()
+            if should_cache(value):
+                await self.aset(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # Mark retrieved so an unawaited future does not log; waiters still get the error
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+# --- Search cache
+def normalize_query(query: str) -> str:
+    """Canonical form of a search query, so trivially different queries share a cache entry.
+
+    Only case, punctuation and whitespace are ignored. Word order and every word are kept: "impact of A on B"
+    and "impact of B on A" are different searches.
+    """
+    text = unicodedata.normalize("NFKC", query).lower()
+    return " ".join(re.findall(r"\w+", text))
+
+def search_cache_key(source: str, query: str) -> str:
+    return hashlib.sha256(f"{source}\x00{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+search_cache = TieredCache(
+    "search",
+    MemoryLRU(search_cache_memory_entries, ttl_seconds=search_cache_ttl_seconds),
+    DiskCache(search_cache_path, "search_results", search_cache_disk_entries, ttl_seconds=search_cache_ttl_seconds),
+) if search_cache_enabled else None
+
+async def cached_search(source: str, query: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Runs `fetch` through the search cache (when enabled). Only list results are cached, so errors are retried."""
+    if search_cache is None:
+        return await fetch()
+    return await search_cache.aget_or_fetch(search_cache_key(source, query), fetch, should_cache=lambda value: isinstance(value, list))
+
+
+# --- LLM response cache
+class LLMResponseCache(BaseCache):
+    """LangChain cache for deterministic (temperature 0) chat model calls: memory LRU + SQLite.
+
+    LangChain calls it with the serialized messages as `prompt` and an `llm_string` describing the model,
+    its parameters and any bound tools / response format (so `with_structured_output` schemas are part of
+    the key). Entries are keyed by a hash of both. Generations are kept serialized, also in memory, so callers
+    that mutate the returned message (e.g. setting `.name`) cannot corrupt the cache.
+    """
+
+    def __init__(self, memory: MemoryLRU, disk: Optional[DiskCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _decode(raw: str) -> RETURN_VAL_TYPE:
+        with suppress_langchain_beta_warning():
+            return loads(raw)
+
+    def _lookup_memory(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        raw = self.memory.get(key, None)
+        if raw is None:
+            return None
+        self.stats["memory_hits"] += 1
+        return self._decode(raw)
+
+    def _read_disk(self, key: str) -> Optional[tuple]:
+        # Only the SQLite read: safe to run in a worker thread
+        return self.disk.get(key) if self.disk is not None else None
+
+    def _disk_result(self, key: str, entry: Optional[tuple]) -> Optional[RETURN_VAL_TYPE]:
+        # Touches the memory LRU and stats, so it runs on the caller's (event loop) thread
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        stored_at, raw = entry
+        self.memory.set(key, raw, stored_at=stored_at)
+        self.stats["disk_hits"] += 1
+        return self._decode(raw)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        result = self._lookup_memory(key) or self._disk_result(key, self._read_disk(key))
+        if result is not None:
+            record_cache_hit("llm")
+        return result
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        result = self._lookup_memory(key)
+        if result is None:
+            result = self._disk_result(key, await asyncio.to_thread(self._read_disk, key))
+        if result is not None:
+            record_cache_hit("llm") # Lets the node's trace tell cached calls from paid ones
+        return result
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key, raw = self._key(prompt, llm_string), dumps(list(return_val))
+        self.memory.set(key, raw)
+        if self.disk is not None:
+            self.disk.set(key, raw)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key, raw = self._key(prompt, llm_string), dumps(list(return_val))
+        self.memory.set(key, raw)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, raw)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+_llm_response_cache: Optional[LLMResponseCache] = None
+
+def get_llm_response_cache() -> LLMResponseCache:
+    global _llm_response_cache
+    if _llm_response_cache is None:
+        _llm_response_cache = LLMResponseCache(
+            MemoryLRU(llm_cache_memory_entries, ttl_seconds=llm_cache_ttl_seconds),
+            DiskCache(llm_cache_path, "llm_responses", llm_cache_disk_entries, ttl_seconds=llm_cache_ttl_seconds),
+        )
+    return _llm_response_cache
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
+from app.api.core.config import thread_lock_dir, cancel_poll_interval_seconds
+from app.api.core.locks import _lock_path, is_thread_locked
+
+# Cancellation and hard deadlines for graph runs.
+# Each run executes in its own task, registered by thread_id. Cancelling that task cancels every in-flight
+# node (LLM and search calls included) through normal asyncio cancellation; the thread keeps its last
+# checkpoint and can be resumed later. A watcher per run stops it when its deadline passes, or when a
+# cancel marker file appears in THREAD_LOCK_DIR, which is how a cancel request reaches the worker running the thread.
+
+
+class RunCancelledError(RuntimeError):
+    """Raised to the caller of a run that was stopped by a cancel request or its deadline."""
+
+
+class _RunHandle:
+    def __init__(self, thread_id: str, task: "asyncio.Task[Any]", deadline_at: Optional[float]):
+        self.thread_id = thread_id
+        self.task = task
+        self.deadline_at = deadline_at
+        self.reason: Optional[str] = None
+        self.watcher: Optional["asyncio.Task[None]"] = None
+
+    def stop(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+        self.task.cancel()
+
+_runs: Dict[str, _RunHandle] = {}
+
+def _marker_path(thread_id: str) -> str:
+    return _lock_path(thread_id)[:-len(".lock")] + ".cancel"
+
+def _remove_marker(thread_id: str) -> None:
+    try:
+        os.remove(_marker_path(thread_id))
+    except FileNotFoundError:
+        pass
+
+async def _watch(handle: _RunHandle) -> None:
+    marker = _marker_path(handle.thread_id)
+    while not handle.task.done():
+        if os.path.exists(marker):
+            handle.stop(f"Run on thread {handle.thread_id} was cancelled.")
+        elif handle.deadline_at is not None and time.time() >= handle.deadline_at:
+            handle.stop(f"Run on thread {handle.thread_id} exceeded its deadline.")
+        await asyncio.sleep(cancel_poll_interval_seconds)
+
+def _start(thread_id: str, coro: Awaitable[Any], deadline_at: Optional[float]) -> _RunHandle:
+    _remove_marker(thread_id) # Left over from a cancel that raced with the end of a previous run
+    handle = _RunHandle(thread_id, asyncio.ensure_future(coro), deadline_at)
+    handle.watcher = asyncio.create_task(_watch(handle))
+    _runs[thread_id] = handle
+    return handle
+
+async def _finish(handle: _RunHandle) -> None:
+    handle.watcher.cancel()
+    if not handle.task.done():
+        handle.task.cancel()
+    await asyncio.gather(handle.task, handle.watcher, return_exceptions=True)
+    if _runs.get(handle.thread_id) is handle:
+        del _runs[handle.thread_id]
+    _remove_marker(handle.thread_id)
+
+
+async def run_cancellable(thread_id: str, coro: Awaitable[Any], deadline_at: Optional[float] = None) -> Any:
+    """Awaits `coro` as the cancellable run of `thread_id`. Raises RunCancelledError if it was stopped."""
+    handle = _start(thread_id, coro, deadline_at)
+    try:
+        # wait() instead of awaiting the task: a CancelledError here always means the caller was cancelled
+        # (the run is then cancelled by _finish), and a stopped run shows up as a cancelled task
+        await asyncio.wait({handle.task})
+        if handle.task.cancelled() and handle.reason is not None:
+            raise RunCancelledError(handle.reason)
+        return handle.task.result()
+    finally:
+        await _finish(handle)
+
+_DONE = object()
+
+async def stream_cancellable(thread_id: str, stream: AsyncIterator[Any], deadline_at: Optional[float] = None) -> AsyncIterator[Any]:
+    """Iterates `stream` (e.g. graph.astream) as the cancellable run of `thread_id`.
+
+    The stream is consumed by its own task, so a cancel stops it even while the consumer is blocked on a
+    slow client; closing this iterator (client disconnected) stops the run too.
+    """
+    queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            async for item in stream:
+                queue.put_nowait((item, None))
+            queue.put_nowait((_DONE, None))
+        except asyncio.CancelledError as e:
+            queue.put_nowait((_DONE, e))
+            raise
+        except Exception as e: # Handed to the consumer instead of being raised in the pump task
+            queue.put_nowait((_DONE, e))
+
+    handle = _start(thread_id, pump(), deadline_at)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is not _DONE:
+                yield item
+            elif isinstance(error, asyncio.CancelledError):
+                raise RunCancelledError(handle.reason or f"Run on thread {thread_id} was cancelled.")
+            elif error is not None:
+                raise error
+            else:
+                return
+    finally:
+        await _finish(handle)
+
+
+def request_cancel(thread_id: str) -> bool:
+    """Stops the run of `thread_id`, wherever it runs. False if no run is in progress."""
+    handle = _runs.get(thread_id)
+    if handle is not None:
+        handle.stop(f"Run on thread {thread_id} was cancelled.")
+        return True
+    if not is_thread_locked(thread_id):
+        return False
+    # Running in another worker: its watcher picks the marker up
+    os.makedirs(thread_lock_dir, exist_ok=True)
+    with open(_marker_path(thread_id), "w"):
+        pass
+    return True
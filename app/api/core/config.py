@@ -8,6 +8,105 @@ from langchain_community.tools import TavilySearchResults
 load_dotenv()
 
 max_interview_turns = 5   # Maximum number of turns in an interview
+max_analysts_limit = int(os.getenv("MAX_ANALYSTS", "10"))   # Largest max_analysts a request may ask for
+
+# Novelty-based early stopping of interviews (see novelty.py)
+novelty_stop_threshold = float(os.getenv("NOVELTY_STOP_THRESHOLD", "0"))   # End the interview once an answer adds less than this share of new n-grams (0 = off; e.g. 0.2)
+novelty_min_turns = int(os.getenv("NOVELTY_MIN_TURNS", "2"))   # Expert answers every interview gets before it can be stopped early
+novelty_shingle_size = int(os.getenv("NOVELTY_SHINGLE_SIZE", "3"))   # Words per n-gram
+
+# Admission control for the interview fan-out (per worker, see admission.py)
+max_concurrent_interviews = int(os.getenv("MAX_CONCURRENT_INTERVIEWS", "12"))   # Interviews running at once across all threads
+max_interviews_per_thread = int(os.getenv("MAX_INTERVIEWS_PER_THREAD", "4"))   # Interviews of one thread running at once; extra Sends queue
+max_queued_interviews = int(os.getenv("MAX_QUEUED_INTERVIEWS", "24"))   # /research/start answers 503 once this many interviews wait (0 = never)
+max_concurrent_jobs = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))   # Background graph runs allowed at once; the rest queue
+max_finished_jobs = int(os.getenv("MAX_FINISHED_JOBS", "1000"))   # Finished job records kept around for status polling
+
+# Checkpointer (graph state persistence)
+checkpointer_backend = os.getenv("CHECKPOINTER_BACKEND", "sqlite")   # "sqlite" (on-disk, bounded) or "memory" (in-process MemorySaver)
+checkpoint_db_path = os.getenv("CHECKPOINT_DB_PATH", "data/checkpoints.sqlite")
+checkpoint_ttl_seconds = int(os.getenv("CHECKPOINT_TTL_SECONDS", str(24 * 3600)))   # Finished threads idle this long are evicted
+checkpoint_idle_ttl_seconds = int(os.getenv("CHECKPOINT_IDLE_TTL_SECONDS", str(7 * 24 * 3600)))   # Unfinished (abandoned) threads idle this long are evicted
+checkpoint_max_threads = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))   # LRU cap on stored threads, finished threads go first
+checkpoint_sweep_interval_seconds = int(os.getenv("CHECKPOINT_SWEEP_INTERVAL_SECONDS", "300"))
+# Append-only channels (operator.add / add_messages) stored as the items added since the parent checkpoint
+checkpoint_delta_channels = [c.strip() for c in os.getenv("CHECKPOINT_DELTA_CHANNELS", "messages,context,sections,report_fragments").split(",") if c.strip()]   # "" disables
+checkpoint_delta_max_chain = int(os.getenv("CHECKPOINT_DELTA_MAX_CHAIN", "16"))   # Compaction: a full copy after this many deltas in a row, bounding reads
+state_snapshot_cache_size = int(os.getenv("STATE_SNAPSHOT_CACHE_SIZE", "256"))   # Latest state snapshot per thread kept by each worker's AgentService (0 disables)
+
+# Multi-worker deployment (uvicorn --workers N). Workers share graph state through the SQLite checkpointer
+# and serialize runs on the same thread with per-thread file locks.
+api_workers = int(os.getenv("API_WORKERS", "1"))
+thread_lock_dir = os.getenv("THREAD_LOCK_DIR", "data/locks")
+thread_lock_timeout_seconds = float(os.getenv("THREAD_LOCK_TIMEOUT_SECONDS", "5"))   # How long a request waits for a busy thread before giving up
+
+# Speculative prefetch while the user reviews the analysts (see speculation.py)
+speculative_prefetch_enabled = os.getenv("SPECULATIVE_PREFETCH", "false").lower() == "true"
+speculative_prefetch_ttl_seconds = int(os.getenv("SPECULATIVE_PREFETCH_TTL_SECONDS", "1800"))   # Prefetches of threads nobody answered are dropped after this long
+
+# Cancellation and deadlines of research runs (see cancellation.py)
+research_deadline_seconds = float(os.getenv("RESEARCH_DEADLINE_SECONDS", "0"))   # Default time budget of one run after feedback (0 = no deadline; requests can set deadline_seconds)
+deadline_wrapup_seconds = float(os.getenv("DEADLINE_WRAPUP_SECONDS", "120"))   # Interviews stop this long before the deadline, leaving time for sections and the report
+cancel_poll_interval_seconds = float(os.getenv("CANCEL_POLL_INTERVAL_SECONDS", "0.5"))   # How often a run checks for cancel requests from other workers
+
+# Search result cache (web_search / search_wikipedia), keyed by normalized query
+search_cache_enabled = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+search_cache_path = os.getenv("SEARCH_CACHE_PATH", "data/search_cache.sqlite")
+search_cache_ttl_seconds = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(24 * 3600)))
+search_cache_memory_entries = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "512"))
+search_cache_disk_entries = int(os.getenv("SEARCH_CACHE_DISK_ENTRIES", "20000"))
+
+# Context budget for the prompts that read the accumulated search context (0 = no budget, send everything)
+answer_context_token_budget = int(os.getenv("ANSWER_CONTEXT_TOKEN_BUDGET", "6000"))   # generate_answer
+section_context_token_budget = int(os.getenv("SECTION_CONTEXT_TOKEN_BUDGET", "12000"))   # write_section
+context_passage_tokens = int(os.getenv("CONTEXT_PASSAGE_TOKENS", "250"))   # Long pages are split into passages of about this size
+retrieval_top_k_passages = int(os.getenv("RETRIEVAL_TOP_K_PASSAGES", "6"))   # Passages each search node keeps per query (BM25 rerank, 0 = keep all)
+
+# Thread-scoped document pool shared by a thread's interviews (see documents.py)
+document_near_duplicate_threshold = float(os.getenv("DOCUMENT_NEAR_DUPLICATE_THRESHOLD", "0.8"))   # Estimated Jaccard similarity above which two documents count as one
+document_shingle_size = int(os.getenv("DOCUMENT_SHINGLE_SIZE", "5"))   # Words per shingle
+document_minhash_permutations = int(os.getenv("DOCUMENT_MINHASH_PERMUTATIONS", "64"))
+document_pool_cache_size = int(os.getenv("DOCUMENT_POOL_CACHE_SIZE", "64"))   # Thread pools kept in memory (the rest are reloaded from SQLite)
+
+# Report phase (opt-in): write the introduction and conclusion from a digest of the sections (title + opening
+# of each summary) instead of their full text. write_report always gets the full sections.
+report_digest_enabled = os.getenv("REPORT_DIGEST_ENABLED", "false").lower() == "true"
+report_digest_words = int(os.getenv("REPORT_DIGEST_WORDS", "80"))   # Words of each section's summary kept in the digest
+
+# "batch": write_report consolidates all sections in one LLM call once every interview is done.
+# "progressive": each interview also writes its passage of the report right after its section, and write_report
+# only merges those passages (citations renumbered, sources deduplicated), without an LLM call.
+report_mode = os.getenv("REPORT_MODE", "batch").lower()
+
+# Interview history window: prompts get the opening turn, a running summary and the last N exchanges (0 = full history)
+conversation_window_exchanges = int(os.getenv("CONVERSATION_WINDOW_EXCHANGES", "0"))
+
+# Opt-in LLM response cache. Only attached to temperature-0 models, where identical prompts give identical answers.
+llm_cache_enabled = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+llm_cache_path = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite")
+llm_cache_memory_entries = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+llm_cache_disk_entries = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "5000"))
+llm_cache_ttl_seconds = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Per-node tracing (wall time, queue wait, tokens, cost, cache hits) behind /metrics and /research/{thread_id}/trace
+tracing_enabled = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+trace_max_spans = int(os.getenv("TRACE_MAX_SPANS", "100000"))   # Oldest node spans are dropped beyond this
+
+# Outbound call scheduler (see scheduler.py). Set these to your account's quota; they are split evenly across
+# API_WORKERS. 0 disables a limit.
+llm_requests_per_minute = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "5000"))
+llm_tokens_per_minute = float(os.getenv("LLM_TOKENS_PER_MINUTE", "450000"))   # Prompt + completion tokens
+llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))   # LLM requests in flight at once, per worker
+fallback_llm_requests_per_minute = float(os.getenv("FALLBACK_LLM_REQUESTS_PER_MINUTE", str(llm_requests_per_minute)))   # Quota of FALLBACK_MODEL
+fallback_llm_tokens_per_minute = float(os.getenv("FALLBACK_LLM_TOKENS_PER_MINUTE", str(llm_tokens_per_minute)))
+fallback_llm_max_concurrency = int(os.getenv("FALLBACK_LLM_MAX_CONCURRENCY", str(llm_max_concurrency)))
+llm_expected_completion_tokens = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1000"))   # Reserved per call until the real usage is known
+tavily_requests_per_minute = float(os.getenv("TAVILY_REQUESTS_PER_MINUTE", "100"))
+tavily_max_concurrency = int(os.getenv("TAVILY_MAX_CONCURRENCY", "8"))
+rate_limit_retries = int(os.getenv("RATE_LIMIT_RETRIES", "2"))   # Retries after a 429 that got through anyway; each pauses the limiter first
+rate_limit_cooldown_seconds = float(os.getenv("RATE_LIMIT_COOLDOWN_SECONDS", "10"))   # Pause after a 429 without a Retry-After header
+llm_transient_retries = int(os.getenv("LLM_TRANSIENT_RETRIES", "2"))   # Retries of an LLM call after a timeout, connection error, 408/409 or 5xx
+llm_transient_backoff_seconds = float(os.getenv("LLM_TRANSIENT_BACKOFF_SECONDS", "0.5"))   # Doubles with every retry
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
@@ -17,13 +116,61 @@ if not OPENAI_API_KEY:
 if not TAVILY_API_KEY:
     raise ValueError("TAVILY_API_KEY not found in environment variables.")
 
+def _response_cache(temperature: float):
+    # Imported here because cache.py reads its settings from this module (all defined above)
+    from app.api.core.cache import get_llm_response_cache
+    return get_llm_response_cache() if llm_cache_enabled and temperature == 0.0 else None
+
+def _chat_model(model: str) -> ChatOpenAI:
+    return ChatOpenAI(
+        model=model,
+        temperature=0.0,
+        api_key=OPENAI_API_KEY,
+        max_retries=0, # The SDK would retry 429s and 5xx itself while holding a scheduler slot; ainvoke_llm retries instead
+        cache=_response_cache(0.0)
+    )
+
+def _parse_node_tiers(value: str) -> dict:
+    # "ask_question=strong,write_introduction=fast"
+    pairs = [item.split("=", 1) for item in value.split(",") if "=" in item]
+    return {node.strip(): tier.strip() for node, tier in pairs}
+
+# Model routing: every node's LLM calls go to a tier. Rewriting a conversation into a search query or asking the
+# next question is easy work for a small model; answers, sections and the report get the strong one. When the
+# primary model is rate-limited, the scheduler sends the call to the fallback tier instead of waiting.
+model_tier_names = {
+    "fast": os.getenv("FAST_MODEL", "gpt-4o-mini"),
+    "strong": os.getenv("STRONG_MODEL", "gpt-4o"),
+    "fallback": os.getenv("FALLBACK_MODEL", "gpt-4.1-mini"),   # "" = no fallback, wait for the primary
+}
+node_model_tiers = {
+    "create_analysts": "strong",
+    "ask_question": "fast",
+    "create_search_query": "fast",
+    "generate_answer": "strong",
+    "write_section": "strong",
+    "write_report_fragment": "strong",
+    "write_report": "strong",
+    "write_introduction": "strong",
+    "write_conclusion": "strong",
+    **_parse_node_tiers(os.getenv("NODE_MODEL_TIERS", "")),   # Overrides, e.g. NODE_MODEL_TIERS="write_introduction=fast"
+}
+
 # Initialize LLM and Tools (globally or passed as dependencies)
-llm = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0.0,
-    api_key=OPENAI_API_KEY,
-    max_retries=5
-)
+model_tiers = {tier: _chat_model(model) for tier, model in model_tier_names.items() if model}
+llm = model_tiers["strong"] # Default model for callers that do not route by node
+
+def get_llm(node: str, schema=None) -> tuple:
+    """(primary, fallback) models for `node`, as structured-output runnables if `schema` is given.
+    fallback is None when there is no fallback tier or it is the node's own model."""
+    primary = model_tiers[node_model_tiers.get(node, "strong")]
+    fallback = model_tiers.get("fallback")
+    if fallback is primary or getattr(fallback, "model_name", None) == getattr(primary, "model_name", ""):
+        fallback = None
+    if schema is not None:
+        primary = primary.with_structured_output(schema)
+        fallback = fallback.with_structured_output(schema) if fallback is not None else None
+    return primary, fallback
 
 tavily_search = TavilySearchResults(max_results=3, tavily_api_key=TAVILY_API_KEY)
 
@@ -186,6 +333,26 @@ Here are the memos from your analysts to build your report from:
 
 {context}"""
 
+report_fragment_instructions_template = """You are a technical writer contributing to a report on this overall topic: 
+
+{topic}
+
+You will be given one memo, written by an analyst after an interview with an expert on a specific sub-topic.
+
+Your task: rewrite the insights of this memo as a passage of the report's consolidated narrative.
+
+To format your passage:
+
+1. Write one or two crisp paragraphs in markdown.
+2. Include no pre-amble, no title and no sub-headings.
+3. Do not mention any analyst names.
+4. Preserve the citations of the memo exactly as they are, for example [1] or [2]. Do not renumber them.
+5. Do not add a list of sources.
+
+Here is the memo: 
+
+{section}"""
+
 intro_conclusion_instructions_template = """You are a technical writer finishing a report on {topic}
 
 You will be given all of the sections of the report.
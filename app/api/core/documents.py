@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.api.core.config import (
+    checkpointer_backend, checkpoint_db_path,
+    document_minhash_permutations, document_shingle_size, document_near_duplicate_threshold, document_pool_cache_size
+)
+
+# Thread-scoped document pool shared by all interviews of a research thread.
+# Search nodes add what they retrieve here and keep only document ids in the interview's `context`, so a
+# page several analysts find is stored (and checkpointed) once, and near-duplicates (the same article under
+# another URL, syndicated copies, an updated snippet) collapse into one document instead of being sent twice.
+# Documents are keyed by source and content hash; near-duplicates are found by comparing MinHash signatures
+# of word shingles (estimated Jaccard similarity >= DOCUMENT_NEAR_DUPLICATE_THRESHOLD).
+# Documents are kept as compact DocumentRecords (content once, passages as offsets into it) and only rendered
+# into '<Document ...>' prompt text when a prompt is built (context.py).
+
+_WORD_RE = re.compile(r"\w+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(20240601) # Fixed seed: signatures must be comparable across processes and restarts
+_PERM_A = _rng.randint(1, 1 << 31, size=document_minhash_permutations).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=document_minhash_permutations).astype(np.uint64)
+
+
+def minhash_signature(text: str, shingle_size: int = document_shingle_size) -> np.ndarray:
+    words = _WORD_RE.findall(text.lower())
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    # (a * x + b) mod p per permutation; a, x < 2^32 so the product cannot overflow
+    return ((np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME).min(axis=0)
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+def document_id(source: str, digest: str) -> str:
+    return hashlib.sha1(f"{source}\x00{digest}".encode("utf-8")).hexdigest()[:16]
+
+
+class DocumentRecord:
+    """One pooled document. `passage_offsets` are (start, end) character spans of its passages in `content`,
+    filled in by context.py (None until then, e.g. for rows stored before offsets existed)."""
+
+    __slots__ = ("doc_id", "kind", "source", "title", "content", "content_hash", "passage_offsets")
+
+    def __init__(self, kind: str, source: str, title: str, content: str, digest: Optional[str] = None,
+                 doc_id: Optional[str] = None, passage_offsets: Optional[Sequence[Tuple[int, int]]] = None):
+        self.kind = kind # "web" (Tavily) or "wikipedia"
+        self.source = source
+        self.title = title
+        self.content = content
+        self.content_hash = digest or content_hash(content)
+        self.doc_id = doc_id or document_id(source, self.content_hash)
+        self.passage_offsets = tuple(tuple(span) for span in passage_offsets) if passage_offsets is not None else None
+
+    @property
+    def attrs(self) -> str:
+        # The '<Document ...>' attributes the prompts' citation rules refer to
+        if self.kind == "web":
+            return f'href="{self.source}"'
+        return f'source="{self.source}" page=""'
+
+    def passage(self, index: int) -> str:
+        start, end = self.passage_offsets[index]
+        return self.content[start:end]
+
+    def render(self, passages: Sequence[str]) -> str:
+        return f"<Document {self.attrs} />\n" + "\n...\n".join(passages) + "\n</Document>"
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "kind": self.kind, "source": self.source, "title": self.title, "content": self.content,
+            "passage_offsets": self.passage_offsets,
+        })
+
+    @classmethod
+    def from_json(cls, doc_id: str, digest: str, data: str) -> "DocumentRecord":
+        fields = json.loads(data)
+        if "kind" not in fields: # Stored as {"attrs", "source", "content"}
+            fields = {"kind": "web" if fields["attrs"].startswith("href=") else "wikipedia", "source": fields["source"],
+                      "title": "", "content": fields["content"]}
+        return cls(fields["kind"], fields["source"], fields.get("title", ""), fields["content"], digest, doc_id,
+                   fields.get("passage_offsets"))
+
+
+class _Pool:
+    """Documents of one thread, with the indexes used for deduplication."""
+
+    def __init__(self):
+        self.documents: Dict[str, DocumentRecord] = {}
+        self.by_hash: Dict[str, str] = {} # content hash -> id
+        self.signature_ids: List[str] = []
+        self.signatures = np.empty((0, document_minhash_permutations), dtype=np.uint64)
+
+    def add(self, record: DocumentRecord, signature: np.ndarray) -> None:
+        self.documents[record.doc_id] = record
+        self.by_hash[record.content_hash] = record.doc_id
+        self.signature_ids.append(record.doc_id)
+        self.signatures = np.vstack([self.signatures, signature])
+
+    def near_duplicate(self, signature: np.ndarray) -> Optional[str]:
+        if not self.signature_ids:
+            return None
+        similarity = (self.signatures == signature).mean(axis=1)
+        best = int(similarity.argmax())
+        return self.signature_ids[best] if similarity[best] >= document_near_duplicate_threshold else None
+
+
+class DocumentStore:
+    """Per-thread document pools, in memory and (with a path) persisted to SQLite so any worker can resolve ids.
+
+    Memory holds the `cache_size` most recently used pools when persisted; without a path nothing is evicted,
+    like the in-process MemorySaver it goes with.
+    """
+
+    def __init__(self, path: Optional[str] = None, cache_size: int = document_pool_cache_size):
+        self.cache_size = cache_size
+        self.pools: "OrderedDict[str, _Pool]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {"added": 0, "exact_duplicates": 0, "near_duplicates": 0}
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            with self.lock:
+                self.conn.executescript(
+                    """
+                    PRAGMA journal_mode=WAL;
+                    CREATE TABLE IF NOT EXISTS thread_documents (
+                        thread_id TEXT NOT NULL,
+                        doc_id TEXT NOT NULL,
+                        content_hash TEXT NOT NULL,
+                        signature BLOB NOT NULL,
+                        data TEXT NOT NULL,
+                        PRIMARY KEY (thread_id, doc_id)
+                    );
+                    """
+                )
+
+    def _pool(self, thread_id: str, reload: bool = False) -> _Pool:
+        # Caller holds self.lock
+        pool = self.pools.get(thread_id)
+        if pool is None or (reload and self.conn is not None):
+            pool = _Pool()
+            if self.conn is not None:
+                rows = self.conn.execute(
+                    "SELECT doc_id, content_hash, signature, data FROM thread_documents WHERE thread_id = ? ORDER BY rowid",
+                    (thread_id,),
+                ).fetchall()
+                for doc_id, digest, signature, data in rows:
+                    pool.add(DocumentRecord.from_json(doc_id, digest, data), np.frombuffer(signature, dtype=np.uint64))
+            self.pools[thread_id] = pool
+        self.pools.move_to_end(thread_id)
+        if self.conn is not None:
+            while len(self.pools) > self.cache_size:
+                self.pools.popitem(last=False)
+        return pool
+
+    def add_documents(self, thread_id: str, records: List[DocumentRecord]) -> List[str]:
+        """Adds records to the thread's pool. Returns the id of each one, which is the id of an already
+        stored copy for duplicates."""
+        ids = []
+        with self.lock:
+            pool = self._pool(thread_id)
+            for record in records:
+                doc_id = pool.by_hash.get(record.content_hash)
+                if doc_id is not None:
+                    self.stats["exact_duplicates"] += 1
+                    ids.append(doc_id)
+                    continue
+                signature = minhash_signature(record.content)
+                doc_id = pool.near_duplicate(signature)
+                if doc_id is not None:
+                    self.stats["near_duplicates"] += 1
+                    ids.append(doc_id)
+                    continue
+                pool.add(record, signature)
+                self.stats["added"] += 1
+                if self.conn is not None:
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO thread_documents (thread_id, doc_id, content_hash, signature, data) VALUES (?, ?, ?, ?, ?)",
+                        (thread_id, record.doc_id, record.content_hash, signature.astype(np.uint64).tobytes(), record.to_json()),
+                    )
+                ids.append(record.doc_id)
+            if self.conn is not None:
+                self.conn.commit()
+        return ids
+
+    def get_documents(self, thread_id: str, doc_ids: List[str]) -> Dict[str, DocumentRecord]:
+        """id -> document for the ids found in the thread's pool."""
+        with self.lock:
+            pool = self._pool(thread_id)
+            if any(doc_id not in pool.documents for doc_id in doc_ids): # Added by another worker since we loaded the pool
+                pool = self._pool(thread_id, reload=True)
+            return {doc_id: pool.documents[doc_id] for doc_id in doc_ids if doc_id in pool.documents}
+
+    # Async API for graph nodes: MinHash work and SQLite I/O (on the checkpoint database, which other
+    # workers write to) run in a worker thread instead of on the event loop
+    async def aadd_documents(self, thread_id: str, records: List[DocumentRecord]) -> List[str]:
+        return await asyncio.to_thread(self.add_documents, thread_id, records)
+
+    async def aget_documents(self, thread_id: str, doc_ids: List[str]) -> Dict[str, DocumentRecord]:
+        return await asyncio.to_thread(self.get_documents, thread_id, doc_ids)
+
+    def forget(self, thread_id: str) -> None:
+        """Drops the in-memory copy of a pool whose rows were deleted elsewhere (checkpoint eviction)."""
+        with self.lock:
+            self.pools.pop(thread_id, None)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.lock:
+            self.pools.pop(thread_id, None)
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM thread_documents WHERE thread_id = ?", (thread_id,))
+                self.conn.commit()
+
+document_store = DocumentStore(checkpoint_db_path if checkpointer_backend == "sqlite" else None)
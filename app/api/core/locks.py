@@ -0,0 +1,63 @@
+import asyncio
+import fcntl
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from app.api.core.config import thread_lock_dir, thread_lock_timeout_seconds
+
+# Per-thread_id exclusive locks shared by every worker process on the host.
+# flock() locks belong to the open file description, so they also exclude other coroutines of the same
+# process, and the OS drops them if a worker dies mid-run.
+
+
+class ThreadBusyError(RuntimeError):
+    """Raised when another request (in this or another worker) is still running the same thread."""
+
+
+def _lock_path(thread_id: str) -> str:
+    safe_id = "".join(c for c in str(thread_id) if c.isalnum() or c in "-_")
+    return os.path.join(thread_lock_dir, f"{safe_id}.lock")
+
+def remove_thread_lock(thread_id: str) -> None:
+    # Called when a thread is evicted from the checkpointer, so lock files do not pile up
+    try:
+        os.remove(_lock_path(thread_id))
+    except FileNotFoundError:
+        pass
+
+@asynccontextmanager
+async def thread_lock(thread_id: str, timeout: float = thread_lock_timeout_seconds) -> AsyncIterator[None]:
+    os.makedirs(thread_lock_dir, exist_ok=True)
+    fd = os.open(_lock_path(thread_id), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise ThreadBusyError(f"Thread {thread_id} is busy with another run. Try again later.")
+                await asyncio.sleep(0.05) # Poll instead of blocking the event loop on flock()
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def is_thread_locked(thread_id: str) -> bool:
+    """True if some worker (this one included) is running the thread right now."""
+    try:
+        fd = os.open(_lock_path(thread_id), os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return False
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
@@ -0,0 +1,261 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from openai import APIConnectionError, APIStatusError, RateLimitError
+from app.api.core.config import (
+    api_workers,
+    llm_requests_per_minute, llm_tokens_per_minute, llm_max_concurrency, llm_expected_completion_tokens,
+    fallback_llm_requests_per_minute, fallback_llm_tokens_per_minute, fallback_llm_max_concurrency,
+    tavily_requests_per_minute, tavily_max_concurrency,
+    rate_limit_retries, rate_limit_cooldown_seconds, llm_transient_retries, llm_transient_backoff_seconds
+)
+from app.api.core.tracing import record_queue_wait, record_model_fallback
+
+# Process-wide scheduler for outbound LLM and search calls.
+# Every call first reserves capacity from token buckets (requests/min and, for the LLM, tokens/min) and a
+# concurrency cap, so bursts from parallel interviews are smoothed to the provider's quota instead of
+# turning into 429s and client-side exponential backoff. Waiting calls are served by priority lane
+# (INTERACTIVE before BULK before SPECULATIVE), FIFO within a lane.
+# Limits are account-wide, so with several workers each process takes an equal share (API_WORKERS).
+
+INTERACTIVE = 0 # A user is waiting on the response (analyst generation behind /start)
+BULK = 1 # Interview turns and report writing
+SPECULATIVE = 2 # Prefetch while the user reviews analysts (see speculation.py); may be thrown away
+
+# Lane of calls that do not pass a priority. A background task sets it once for everything it runs.
+current_lane: ContextVar[int] = ContextVar("scheduler_lane", default=BULK)
+
+
+class TokenBucket:
+    """Continuously refilling bucket: `per_minute` units per minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity) # A single request larger than the bucket must still get through
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain(self) -> None:
+        self._refill()
+        self.level = min(self.level, 0.0)
+
+
+class Reservation:
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.actual_tokens: Optional[int] = None # Set once the provider reports real usage
+
+
+class RateLimiter:
+    """Requests/min + tokens/min token buckets, a concurrency cap and priority lanes for one provider.
+
+    A limit <= 0 disables that limit.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0, max_concurrency: int = 0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.paused_until = 0.0
+        self._waiters: List[Tuple[int, int]] = [] # Heap of (priority, arrival)
+        self._arrivals = itertools.count()
+        self._condition: Optional[asyncio.Condition] = None # Created lazily, inside the running event loop
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _delay(self, tokens: int) -> Optional[float]:
+        """Seconds the head of the queue must wait for capacity, or None if it waits for a release."""
+        if self.max_concurrency > 0 and self.active >= self.max_concurrency:
+            return None
+        delays = [self.paused_until - time.monotonic()]
+        if self.requests is not None:
+            delays.append(self.requests.delay(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.delay(tokens))
+        return max(0.0, *delays)
+
+    async def _acquire(self, tokens: int, priority: int) -> None:
+        condition = self._get_condition()
+        entry = (priority, next(self._arrivals))
+        async with condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    delay = self._delay(tokens) if self._waiters[0] == entry else None
+                    if delay == 0:
+                        heapq.heappop(self._waiters)
+                        self.active += 1
+                        if self.requests is not None:
+                            self.requests.take(1)
+                        if self.tokens is not None:
+                            self.tokens.take(tokens)
+                        condition.notify_all() # The next waiter is now at the head
+                        return
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters: # Cancelled while queued: leave the queue
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    condition.notify_all()
+                raise
+
+    async def _release(self, reservation: Reservation) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.active -= 1
+            if self.tokens is not None and reservation.actual_tokens is not None:
+                # Reservations are estimates; refund what was not used (or charge what was over)
+                difference = reservation.tokens - reservation.actual_tokens
+                if difference > 0:
+                    self.tokens.give_back(difference)
+                else:
+                    self.tokens.take(-difference)
+            condition.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, tokens: int = 0, priority: int = BULK) -> AsyncIterator[Reservation]:
+        """Waits for capacity, holds a concurrency slot for the duration of the block."""
+        start = time.perf_counter()
+        await self._acquire(tokens, priority)
+        record_queue_wait(time.perf_counter() - start)
+        reservation = Reservation(tokens)
+        try:
+            yield reservation
+        finally:
+            await self._release(reservation)
+
+    async def pause(self, seconds: float) -> None:
+        """Stops handing out capacity for `seconds` (after the provider said we are over quota)."""
+        condition = self._get_condition()
+        async with condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.drain()
+            condition.notify_all()
+
+
+llm_limiter = RateLimiter(
+    "llm",
+    requests_per_minute=llm_requests_per_minute / api_workers,
+    tokens_per_minute=llm_tokens_per_minute / api_workers,
+    max_concurrency=llm_max_concurrency,
+)
+# OpenAI quotas are per model, so the fallback gets its own limiter (FALLBACK_LLM_*) and is not held up while the primary is paused
+llm_fallback_limiter = RateLimiter(
+    "llm_fallback",
+    requests_per_minute=fallback_llm_requests_per_minute / api_workers,
+    tokens_per_minute=fallback_llm_tokens_per_minute / api_workers,
+    max_concurrency=fallback_llm_max_concurrency,
+)
+tavily_limiter = RateLimiter(
+    "tavily",
+    requests_per_minute=tavily_requests_per_minute / api_workers,
+    max_concurrency=tavily_max_concurrency,
+)
+
+
+def estimate_prompt_tokens(messages: List[Any]) -> int:
+    return sum(len(str(getattr(message, "content", message))) for message in messages) // 4 + 4 * len(messages)
+
+def _retry_after(error: RateLimitError) -> float:
+    try:
+        return float(error.response.headers.get("retry-after", rate_limit_cooldown_seconds))
+    except (AttributeError, TypeError, ValueError):
+        return rate_limit_cooldown_seconds
+
+def _is_transient(error: Exception) -> bool:
+    # What the OpenAI SDK would retry, minus 429s (handled by pausing the limiter in ainvoke_llm)
+    if isinstance(error, RateLimitError):
+        return False
+    if isinstance(error, APIConnectionError): # Includes timeouts
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in (408, 409) or error.status_code >= 500)
+
+async def _ainvoke_reserved(limiter: RateLimiter, runnable: Any, messages: List[Any], estimated_tokens: int, priority: int) -> Any:
+    # The chat models are built with max_retries=0, so transient errors are retried here, outside the reservation
+    for attempt in range(llm_transient_retries + 1):
+        try:
+            async with limiter.reserve(estimated_tokens, priority) as reservation:
+                response = await runnable.ainvoke(messages)
+                usage = getattr(response, "usage_metadata", None) # Structured output returns the parsed model: keep the estimate
+                if usage:
+                    reservation.actual_tokens = usage.get("total_tokens")
+                return response
+        except Exception as e:
+            if attempt == llm_transient_retries or not _is_transient(e):
+                raise
+        await asyncio.sleep(llm_transient_backoff_seconds * 2 ** attempt)
+
+async def ainvoke_llm(runnable: Any, messages: List[Any], priority: Optional[int] = None, completion_tokens: int = llm_expected_completion_tokens,
+                      fallback: Any = None) -> Any:
+    """`runnable.ainvoke(messages)` (a chat model or a structured-output chain) through the LLM limiter.
+
+    If the primary model answers with a 429 and a `fallback` runnable is given, the call goes to the fallback
+    (through its own limiter) instead of waiting out the primary's Retry-After. The chat models do not retry
+    429s themselves, so this happens on the first one.
+    """
+    priority = current_lane.get() if priority is None else priority
+    estimated_tokens = estimate_prompt_tokens(messages) + completion_tokens
+    for attempt in range(rate_limit_retries + 1):
+        try:
+            return await _ainvoke_reserved(llm_limiter, runnable, messages, estimated_tokens, priority)
+        except RateLimitError as e:
+            if fallback is None and attempt == rate_limit_retries:
+                raise
+            # Quota exhausted anyway (other clients on the key, wrong limits): pause every lane instead of retrying in a storm
+            await llm_limiter.pause(_retry_after(e))
+            if fallback is not None:
+                record_model_fallback()
+                return await _ainvoke_reserved(llm_fallback_limiter, fallback, messages, estimated_tokens, priority)
+
+class SearchRateLimitError(RuntimeError):
+    """Raised when Tavily still rate-limits a search after all retries."""
+
+
+def _is_rate_limited(result: Any) -> bool:
+    # TavilySearchResults returns the repr of the exception instead of raising
+    return isinstance(result, str) and "429" in result
+
+async def ainvoke_search(call: Callable[[], Awaitable[Any]], priority: Optional[int] = None) -> Any:
+    """Runs a Tavily call through the search limiter."""
+    priority = current_lane.get() if priority is None else priority
+    for attempt in range(rate_limit_retries + 1):
+        async with tavily_limiter.reserve(priority=priority):
+            result = await call()
+        if not _is_rate_limited(result):
+            return result
+        if attempt == rate_limit_retries: # Do not hand the error string to callers as if it were results
+            raise SearchRateLimitError(f"Tavily search still rate-limited after {rate_limit_retries + 1} attempts: {result}")
+        await tavily_limiter.pause(rate_limit_cooldown_seconds)
@@ -0,0 +1,359 @@
+import asyncio
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tracers.context import register_configure_hook
+from prometheus_client import CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily
+from app.api.core.config import tracing_enabled, trace_max_spans, checkpointer_backend, checkpoint_db_path
+
+# Per-node tracing for the research graph. Every node run becomes a "span" recording wall time, queue wait,
+# LLM calls, prompt/completion tokens, estimated cost and cache hits, tagged with thread_id and analyst.
+# Spans are kept per thread for /research/{thread_id}/trace; aggregates go to Prometheus metrics for /metrics.
+# Token usage is collected by a callback handler that LangChain attaches to every LLM call made while a
+# node runs (register_configure_hook), so nodes do not have to pass callbacks around.
+
+# USD per million (prompt, completion) tokens. Longest matching prefix of the reported model name wins.
+MODEL_PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "o3-mini": (1.10, 4.40),
+}
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prefixes = [prefix for prefix in MODEL_PRICES_PER_MILLION if model.startswith(prefix)]
+    if not prefixes:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES_PER_MILLION[max(prefixes, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+# --- Prometheus metrics (per process). Labels stay low-cardinality: thread ids and analysts only go into traces.
+registry = CollectorRegistry()
+NODE_DURATION = Histogram(
+    "research_node_duration_seconds", "Wall time of graph node runs.", ["node"], registry=registry,
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160),
+)
+NODE_QUEUE_WAIT = Histogram(
+    "research_node_queue_seconds", "Time node runs spent waiting before or while running (dispatch queue, rate limits).",
+    ["node"], registry=registry, buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60),
+)
+NODE_RUNS = Counter("research_node_runs", "Graph node runs by outcome.", ["node", "status"], registry=registry)
+LLM_TOKENS = Counter("research_llm_tokens", "LLM tokens used by graph nodes.", ["node", "model", "kind"], registry=registry)
+LLM_FALLBACKS = Counter("research_llm_fallbacks", "LLM calls sent to the fallback model because the primary was rate-limited.", ["node"], registry=registry)
+LLM_COST = Counter("research_llm_cost_usd", "Estimated LLM cost of graph nodes in USD.", ["node", "model"], registry=registry)
+CACHE_HITS = Counter("research_cache_hits", "Cache hits inside graph nodes.", ["node", "cache"], registry=registry)
+
+
+class _CacheStatsCollector:
+    """Exports the hit/miss counters the search and LLM response caches already keep."""
+
+    def collect(self):
+        from app.api.core import cache # Imported here: cache.py reports hits through this module
+        family = CounterMetricFamily("research_cache_events", "Search / LLM response cache events.", labels=["cache", "event"])
+        caches = {"search": cache.search_cache, "llm": cache._llm_response_cache}
+        for name, instance in caches.items():
+            for event, count in (instance.stats.items() if instance is not None else ()):
+                family.add_metric([name, event], count)
+        yield family
+
+registry.register(_CacheStatsCollector())
+
+def render_metrics() -> tuple:
+    """(body, content type) of the Prometheus text exposition."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# --- Span storage
+class MemoryTraceStore:
+    """Spans of this process only. Enough for a single worker."""
+
+    def __init__(self, max_spans: int = trace_max_spans):
+        self.max_spans = max_spans
+        self.threads: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self.num_spans = 0
+        self.lock = threading.Lock()
+
+    def add(self, span: Dict[str, Any]) -> None:
+        with self.lock:
+            self.threads.setdefault(span["thread_id"], []).append(span)
+            self.threads.move_to_end(span["thread_id"])
+            self.num_spans += 1
+            while self.num_spans > self.max_spans and len(self.threads) > 1: # Least recently traced threads go first
+                _, dropped = self.threads.popitem(last=False)
+                self.num_spans -= len(dropped)
+
+    def for_thread(self, thread_id: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self.threads.get(thread_id, []))
+
+
+class SqliteTraceStore:
+    """Spans in the shared SQLite file, so a thread's trace is complete whichever worker ran its nodes.
+
+    add() runs on the event loop for every node run, so it only buffers the span. The buffer is written in one
+    batch, in a worker thread, `flush_delay_seconds` after the first span of the batch arrives. Buffered spans
+    are already visible to for_thread() in this worker.
+    """
+
+    def __init__(self, path: str, max_spans: int = trace_max_spans, flush_delay_seconds: float = 0.5):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_spans = max_spans
+        self.flush_delay_seconds = flush_delay_seconds
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db_lock = threading.Lock() # Guards the connection
+        self.lock = threading.Lock() # Guards the buffers; never held while writing to the database
+        self.pending: List[Dict[str, Any]] = []
+        self.flushing: List[Dict[str, Any]] = [] # Batch being written
+        self.flush_task: Optional[asyncio.Future] = None
+        self.inserts = 0
+        atexit.register(self.flush)
+        with self.db_lock:
+            self.conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS node_spans (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    thread_id TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_node_spans_thread ON node_spans (thread_id);
+                """
+            )
+
+    def add(self, span: Dict[str, Any]) -> None:
+        with self.lock:
+            self.pending.append(span)
+            if self.flush_task is not None:
+                return # Joins the batch already scheduled
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError: # No event loop (scripts, tests): write right away
+                loop = None
+            if loop is not None:
+                self.flush_task = loop.create_task(self._flush_later())
+        if loop is None:
+            self.flush()
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_delay_seconds)
+        with self.lock:
+            self.flush_task = None
+        await asyncio.to_thread(self.flush)
+
+    def flush(self) -> None:
+        with self.db_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+                self.flushing = batch
+            if not batch:
+                return
+            try:
+                self.conn.executemany(
+                    "INSERT INTO node_spans (thread_id, data) VALUES (?, ?)",
+                    [(span["thread_id"], json.dumps(span)) for span in batch],
+                )
+                previous, self.inserts = self.inserts, self.inserts + len(batch)
+                if self.inserts // 1000 != previous // 1000: # Trim every ~1000 inserts rather than on every batch
+                    self.conn.execute("DELETE FROM node_spans WHERE id <= (SELECT MAX(id) FROM node_spans) - ?", (self.max_spans,))
+                self.conn.commit()
+            finally:
+                with self.lock:
+                    self.flushing = []
+
+    def for_thread(self, thread_id: str) -> List[Dict[str, Any]]:
+        with self.db_lock: # No batch is half-written while we read
+            rows = self.conn.execute("SELECT data FROM node_spans WHERE thread_id = ? ORDER BY id", (thread_id,)).fetchall()
+            with self.lock:
+                buffered = [span for span in self.flushing + self.pending if span["thread_id"] == thread_id]
+        return [json.loads(row[0]) for row in rows] + buffered
+
+trace_store = SqliteTraceStore(checkpoint_db_path) if checkpointer_backend == "sqlite" else MemoryTraceStore()
+
+
+# --- Span recording
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("research_current_span", default=None)
+_usage_handler: ContextVar[Optional[BaseCallbackHandler]] = ContextVar("research_usage_handler", default=None)
+register_configure_hook(_usage_handler, inheritable=False) # Added to every LLM run started while a node span is open
+
+
+def _model_name(response: LLMResult, generation: Any) -> str:
+    message = getattr(generation, "message", None)
+    return (getattr(message, "response_metadata", None) or {}).get("model_name") \
+        or (response.llm_output or {}).get("model_name") or "unknown"
+
+class _UsageHandler(BaseCallbackHandler):
+    """Adds the token usage of each finished LLM call to the span of the node that made it."""
+
+    run_inline = True # Update the span in the calling task, not in a thread pool
+
+    def __init__(self, span: Dict[str, Any]):
+        self.span = span
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        span = self.span
+        span["llm_calls"] += 1
+        models = [_model_name(response, generation) for generations in response.generations for generation in generations]
+        for model in models[:1]: # Which model tier served the call, see get_llm in config.py
+            span["models"][model] = span["models"].get(model, 0) + 1
+        if span["pending_cached_calls"]: # Served by the LLM response cache: nothing was spent
+            span["pending_cached_calls"] -= 1
+            return
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                model = _model_name(response, generation)
+                prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+                cost = estimate_cost(model, prompt_tokens, completion_tokens)
+                span["prompt_tokens"] += prompt_tokens
+                span["completion_tokens"] += completion_tokens
+                span["cost_usd"] += cost
+                LLM_TOKENS.labels(span["node"], model, "prompt").inc(prompt_tokens)
+                LLM_TOKENS.labels(span["node"], model, "completion").inc(completion_tokens)
+                LLM_COST.labels(span["node"], model).inc(cost)
+
+
+def record_cache_hit(cache_name: str) -> None:
+    """Called by the caches on a hit, to attribute it to the running node."""
+    span = _current_span.get()
+    if span is None:
+        return
+    span["cache_hits"][cache_name] = span["cache_hits"].get(cache_name, 0) + 1
+    if cache_name == "llm":
+        span["pending_cached_calls"] += 1
+    CACHE_HITS.labels(span["node"], cache_name).inc()
+
+def record_model_fallback() -> None:
+    """Called by the scheduler when a call goes to the fallback model."""
+    span = _current_span.get()
+    if span is None:
+        return
+    span["fallbacks"] += 1
+    LLM_FALLBACKS.labels(span["node"]).inc()
+
+def record_queue_wait(seconds: float) -> None:
+    """Adds time the running node spent waiting on a shared resource (rate limiter, semaphore) to its span."""
+    span = _current_span.get()
+    if span is not None:
+        span["queue_seconds"] += seconds
+
+
+def _analyst_name(state: Any) -> Optional[str]:
+    analyst = state.get("analyst") if isinstance(state, dict) else None
+    return getattr(analyst, "name", None)
+
+@asynccontextmanager
+async def node_span(node: str, state: Any, config: Optional[RunnableConfig], queued_since: Optional[float] = None,
+                    speculative: bool = False) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Records one run of `node` as a span. Spans of nodes run inside another node (the interview subgraph)
+    roll their tokens, cost and cache hits up into the enclosing span. Speculative runs (speculation.py) are
+    recorded as "speculative:<node>", so their spend shows up separately in /trace and /metrics."""
+    if not tracing_enabled:
+        yield None
+        return
+    parent = _current_span.get()
+    started_at = time.time()
+    span = {
+        "thread_id": str(((config or {}).get("configurable") or {}).get("thread_id", "")),
+        "node": f"speculative:{node}" if speculative else node,
+        "speculative": speculative,
+        "parent": parent["node"] if parent else None,
+        "analyst": _analyst_name(state),
+        "started_at": started_at,
+        "wall_seconds": 0.0,
+        "queue_seconds": max(0.0, started_at - queued_since) if queued_since else 0.0,
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+        "cache_hits": {},
+        "models": {}, # Model name -> LLM calls it served
+        "fallbacks": 0, # Calls sent to the fallback model
+        "pending_cached_calls": 0,
+        "status": "ok",
+        "error": None,
+    }
+    span_token = _current_span.set(span)
+    handler_token = _usage_handler.set(_UsageHandler(span))
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span["status"] = "error" if isinstance(e, Exception) else "cancelled"
+        span["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        span["wall_seconds"] = time.perf_counter() - start
+        _usage_handler.reset(handler_token)
+        _current_span.reset(span_token)
+        del span["pending_cached_calls"]
+        if parent is not None:
+            for key in ("llm_calls", "prompt_tokens", "completion_tokens", "cost_usd", "fallbacks"):
+                parent[key] += span[key]
+            for counts, parent_counts in ((span["cache_hits"], parent["cache_hits"]), (span["models"], parent["models"])):
+                for name, count in counts.items():
+                    parent_counts[name] = parent_counts.get(name, 0) + count
+        NODE_DURATION.labels(span["node"]).observe(span["wall_seconds"])
+        NODE_QUEUE_WAIT.labels(span["node"]).observe(span["queue_seconds"])
+        NODE_RUNS.labels(span["node"], span["status"]).inc()
+        trace_store.add(span)
+
+
+def traced_node(name: str, node: Callable[[Any], Awaitable[dict]]) -> Callable:
+    """Wraps an async graph node so every run is recorded as a span."""
+    # Deliberately not functools.wraps: LangGraph only passes `config` to functions whose signature has it,
+    # and inspect.signature would follow __wrapped__ to the node's (state) signature.
+    async def run(state: Any, config: RunnableConfig) -> dict:
+        async with node_span(name, state, config):
+            return await node(state)
+    run.__name__ = getattr(node, "__name__", name)
+    run.__doc__ = node.__doc__
+    return run
+
+def traced_subgraph(name: str, graph: Any) -> Callable:
+    """Runs a compiled subgraph as a traced node. Queue wait is measured from the `dispatched_at` the Send
+    payload carries, i.e. how long the run waited to be scheduled after the fan-out."""
+    async def run(state: Any, config: RunnableConfig) -> dict:
+        async with node_span(name, state, config, queued_since=state.get("dispatched_at")):
+            return await graph.ainvoke(state, config)
+    run.__name__ = name
+    return run
+
+
+def summarize_spans(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-node totals of a thread's spans, plus a grand total over top-level spans (nested spans are
+    already included in their parent's numbers) and the part of it spent on speculative prefetches."""
+    fields = ("wall_seconds", "queue_seconds", "llm_calls", "prompt_tokens", "completion_tokens", "cost_usd")
+    nodes: Dict[str, Dict[str, Any]] = {}
+    total = {"runs": 0, **{field: 0 for field in fields}}
+    speculative = {"runs": 0, **{field: 0 for field in fields}}
+    for span in spans:
+        entry = nodes.setdefault(span["node"], {"runs": 0, **{field: 0 for field in fields}, "cache_hits": {}, "models": {}, "fallbacks": 0})
+        entry["runs"] += 1
+        for field in fields:
+            entry[field] += span[field]
+        entry["fallbacks"] += span.get("fallbacks", 0) # Spans recorded before model routing lack the last two
+        for counts, entry_counts in ((span["cache_hits"], entry["cache_hits"]), (span.get("models", {}), entry["models"])):
+            for name, count in counts.items():
+                entry_counts[name] = entry_counts.get(name, 0) + count
+        if span["parent"] is None:
+            for totals in (total, speculative) if span.get("speculative") else (total,):
+                totals["runs"] += 1
+                for field in fields:
+                    totals[field] += span[field]
+    return {"nodes": nodes, "total": total, "speculative": speculative}
@@ -0,0 +1,74 @@
+import asyncio
+from typing import List, Optional
+import httpx
+from langchain_core.documents import Document
+from app.api.core.cache import cached_search
+
+# Async counterpart of langchain's WikipediaLoader. The loader (and its aload) goes through the
+# blocking `wikipedia` package, which ties up an executor thread per page download.
+# Here we talk to the MediaWiki API directly so the fetch only costs an awaitable socket.
+
+WIKIPEDIA_API_URL = "https://{lang}.wikipedia.org/w/api.php"
+WIKIPEDIA_MAX_QUERY_LENGTH = 300 # Same limit the langchain wrapper applies
+
+_client: Optional[httpx.AsyncClient] = None
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(20.0), headers={"User-Agent": "research-assistant-langgraph"})
+    return _client
+
+async def _search_titles(client: httpx.AsyncClient, url: str, query: str, limit: int) -> List[str]:
+    response = await client.get(url, params={
+        "action": "query",
+        "list": "search",
+        "srsearch": query[:WIKIPEDIA_MAX_QUERY_LENGTH],
+        "srlimit": limit,
+        "format": "json",
+    })
+    response.raise_for_status()
+    return [hit["title"] for hit in response.json().get("query", {}).get("search", [])]
+
+async def _fetch_page(client: httpx.AsyncClient, url: str, title: str, doc_content_chars_max: int) -> Optional[Document]:
+    # Multiple plain-text extracts per request are only allowed for intros, so pages are fetched one by one (concurrently)
+    response = await client.get(url, params={
+        "action": "query",
+        "prop": "extracts|info",
+        "explaintext": 1,
+        "inprop": "url",
+        "redirects": 1,
+        "titles": title,
+        "format": "json",
+    })
+    response.raise_for_status()
+    pages = response.json().get("query", {}).get("pages", {})
+    for page in pages.values():
+        content = page.get("extract")
+        if "missing" in page or not content:
+            return None
+        return Document(
+            page_content=content[:doc_content_chars_max],
+            metadata={
+                "title": page.get("title", title),
+                "summary": content.split("\n\n", 1)[0],
+                "source": page.get("fullurl", ""),
+            },
+        )
+    return None
+
+async def _cached_page(client: httpx.AsyncClient, url: str, title: str, doc_content_chars_max: int) -> Optional[Document]:
+    # Different queries (e.g. from different analysts) often find the same pages: fetch each page once
+    async def fetch() -> list:
+        doc = await _fetch_page(client, url, title, doc_content_chars_max)
+        return [{"page_content": doc.page_content, "metadata": doc.metadata}] if doc is not None else []
+    cached = await cached_search("wikipedia_page", f"{url} {title} {doc_content_chars_max}", fetch)
+    return Document(page_content=cached[0]["page_content"], metadata=cached[0]["metadata"]) if cached else None
+
+async def aload_wikipedia(query: str, load_max_docs: int = 3, doc_content_chars_max: int = 4000, lang: str = "en") -> List[Document]:
+    """Non-blocking equivalent of WikipediaLoader(query=..., load_max_docs=...).load()."""
+    client = _get_client()
+    url = WIKIPEDIA_API_URL.format(lang=lang)
+    titles = await _search_titles(client, url, query, load_max_docs)
+    pages = await asyncio.gather(*[_cached_page(client, url, title, doc_content_chars_max) for title in titles[:load_max_docs]])
+    return [doc for doc in pages if doc is not None]
@@ -0,0 +1,334 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from app.api.core.config import (
+    checkpointer_backend, checkpoint_db_path,
+    checkpoint_ttl_seconds, checkpoint_idle_ttl_seconds,
+    checkpoint_max_threads, checkpoint_sweep_interval_seconds, api_workers,
+    checkpoint_delta_channels, checkpoint_delta_max_chain
+)
+from app.api.core.locks import remove_thread_lock
+from app.api.core.documents import document_store
+
+_DELTA_KEY = "__checkpoint_delta__"
+_DELTA_HEADS_MAX = 512 # (thread, namespace) chains whose last written values are remembered for delta encoding
+
+def _is_delta(value: Any) -> bool:
+    return isinstance(value, dict) and _DELTA_KEY in value
+
+def _extends(value: list, base: list) -> bool:
+    return len(value) >= len(base) and all(a is b or a == b for a, b in zip(value, base))
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """SqliteSaver (WAL mode) with async support and TTL/LRU eviction of whole threads.
+
+    The stock SqliteSaver is sync-only, while the graph is driven with ainvoke/astream, so the async methods
+    here run the sync implementation in a worker thread (the saver serializes access with its own lock).
+
+    Every root checkpoint write or read refreshes the thread's `last_used_at`. Periodically (at most every
+    `sweep_interval_seconds`, piggybacked on writes) threads are evicted when:
+      - they are finished (`finished_channel` is set) and idle for more than `ttl_seconds`,
+      - they are unfinished and idle for more than `idle_ttl_seconds`,
+      - more than `max_threads` threads are stored; least recently used go first, finished before unfinished.
+
+    Append-only channels (`delta_channels`: messages, context, sections...) would otherwise be serialized in
+    full by every checkpoint, which grows quadratically over a run. When a checkpoint extends its parent's
+    list, only the new items are stored ({_DELTA_KEY: parent id, "offset", "items"}) and reads rebuild the full
+    value by walking up the parents. After `delta_max_chain` deltas in a row a full copy is written again
+    (compaction), so a read never walks far. The values last written per (thread, namespace) are kept in
+    memory to detect appends; on a miss (restart, another worker wrote the parent) the full value is stored.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        *,
+        ttl_seconds: int = checkpoint_ttl_seconds,
+        idle_ttl_seconds: int = checkpoint_idle_ttl_seconds,
+        max_threads: int = checkpoint_max_threads,
+        sweep_interval_seconds: int = checkpoint_sweep_interval_seconds,
+        finished_channel: Optional[str] = "final_report",
+        delta_channels: Sequence[str] = tuple(checkpoint_delta_channels),
+        delta_max_chain: int = checkpoint_delta_max_chain,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(conn, **kwargs)
+        self.ttl_seconds = ttl_seconds
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_threads = max_threads
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.finished_channel = finished_channel
+        self.delta_channels = tuple(delta_channels)
+        self.delta_max_chain = delta_max_chain
+        self._last_sweep = 0.0
+        # (thread_id, checkpoint_ns) -> (checkpoint id, delta chain length, {channel: list})
+        self._delta_heads: "OrderedDict[Tuple[str, str], Tuple[str, int, Dict[str, list]]]" = OrderedDict()
+        self._delta_lock = threading.Lock()
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs: Any) -> "BoundedSqliteSaver":
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # check_same_thread=False is fine: SqliteSaver guards the connection with a lock.
+        # Every worker process opens its own connection; WAL lets them read concurrently while one writes,
+        # and the busy timeout makes writers queue instead of failing with "database is locked".
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        return cls(conn, **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup() # Creates checkpoints/writes tables and switches to journal_mode=WAL
+        self.conn.executescript(
+            """
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                last_used_at REAL NOT NULL,
+                finished INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_thread_activity_last_used ON thread_activity (finished, last_used_at);
+            """
+        )
+
+    # --- Thread bookkeeping
+    def _touch(self, thread_id: str, finished: Optional[bool] = None) -> None:
+        with self.cursor() as cur:
+            if finished is None:
+                cur.execute(
+                    "INSERT INTO thread_activity (thread_id, last_used_at) VALUES (?, ?) "
+                    "ON CONFLICT(thread_id) DO UPDATE SET last_used_at = excluded.last_used_at",
+                    (thread_id, time.time()),
+                )
+            else:
+                cur.execute(
+                    "INSERT INTO thread_activity (thread_id, last_used_at, finished) VALUES (?, ?, ?) "
+                    "ON CONFLICT(thread_id) DO UPDATE SET last_used_at = excluded.last_used_at, finished = excluded.finished",
+                    (thread_id, time.time(), int(finished)),
+                )
+
+    def _delete_threads(self, cur: sqlite3.Cursor, thread_ids: Sequence[str]) -> None:
+        tables = ["checkpoints", "writes", "thread_activity"]
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'thread_documents'")
+        if cur.fetchone(): # The thread's document pool, when it lives in this database (see documents.py)
+            tables.append("thread_documents")
+        for table in tables:
+            cur.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in thread_ids])
+        for thread_id in thread_ids:
+            remove_thread_lock(thread_id)
+            document_store.forget(thread_id)
+        with self._delta_lock:
+            for key in [key for key in self._delta_heads if key[0] in thread_ids]:
+                del self._delta_heads[key]
+
+    def sweep(self) -> int:
+        """Evicts expired and over-capacity threads. Returns how many threads were deleted."""
+        now = time.time()
+        self._last_sweep = now
+        with self.cursor() as cur:
+            cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE (finished = 1 AND last_used_at < ?) OR (finished = 0 AND last_used_at < ?)",
+                (now - self.ttl_seconds, now - self.idle_ttl_seconds),
+            )
+            expired = [row[0] for row in cur.fetchall()]
+            self._delete_threads(cur, expired)
+
+            cur.execute("SELECT COUNT(*) FROM thread_activity")
+            overflow = cur.fetchone()[0] - self.max_threads
+            evicted = []
+            if overflow > 0:
+                cur.execute(
+                    "SELECT thread_id FROM thread_activity ORDER BY finished DESC, last_used_at ASC LIMIT ?",
+                    (overflow,),
+                )
+                evicted = [row[0] for row in cur.fetchall()]
+                self._delete_threads(cur, evicted)
+        return len(expired) + len(evicted)
+
+    def _maybe_sweep(self) -> None:
+        if time.time() - self._last_sweep >= self.sweep_interval_seconds:
+            self.sweep()
+
+    # --- Delta encoding of append-only channels
+    def _remember_head(self, key: Tuple[str, str], checkpoint_id: str, chain: int, values: Dict[str, Any]) -> None:
+        lists = {channel: list(values[channel]) for channel in self.delta_channels if isinstance(values.get(channel), list)}
+        with self._delta_lock:
+            self._delta_heads[key] = (checkpoint_id, chain, lists)
+            self._delta_heads.move_to_end(key)
+            while len(self._delta_heads) > _DELTA_HEADS_MAX:
+                self._delta_heads.popitem(last=False)
+
+    def _encode_deltas(self, config: RunnableConfig, checkpoint: Checkpoint) -> Tuple[Checkpoint, int]:
+        """Returns the checkpoint to store (appends replaced by deltas when possible) and its delta chain length."""
+        configurable = config["configurable"]
+        parent_id = configurable.get("checkpoint_id")
+        with self._delta_lock:
+            head = self._delta_heads.get((str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")))
+        if not parent_id or head is None or head[0] != parent_id or head[1] >= self.delta_max_chain:
+            return checkpoint, 0
+        channel_values = dict(checkpoint["channel_values"])
+        encoded = False
+        for channel, base in head[2].items():
+            value = channel_values.get(channel)
+            if isinstance(value, list) and _extends(value, base):
+                channel_values[channel] = {_DELTA_KEY: parent_id, "offset": len(base), "items": value[len(base):]}
+                encoded = True
+        if not encoded:
+            return checkpoint, 0
+        return {**checkpoint, "channel_values": channel_values}, head[1] + 1
+
+    def _load_channel_values(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, memo: Dict[str, dict]) -> dict:
+        if checkpoint_id not in memo:
+            with self.cursor(transaction=False) as cur:
+                cur.execute(
+                    "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                )
+                row = cur.fetchone()
+            if row is None:
+                raise ValueError(f"Checkpoint {checkpoint_id} of thread {thread_id} is missing; cannot rebuild its children")
+            memo[checkpoint_id] = self.serde.loads_typed(row)["channel_values"]
+        return memo[checkpoint_id]
+
+    def _decode_deltas(self, checkpoint_tuple: Optional[CheckpointTuple], memo: Dict[str, dict]) -> Tuple[Optional[CheckpointTuple], int]:
+        """Rebuilds delta-encoded channels from the parent checkpoints. Returns the tuple and its delta chain length."""
+        if checkpoint_tuple is None:
+            return None, 0
+        values = checkpoint_tuple.checkpoint["channel_values"]
+        if not any(_is_delta(value) for value in values.values()):
+            return checkpoint_tuple, 0
+        configurable = checkpoint_tuple.config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        channel_values, chain = dict(values), 0
+        for channel, value in values.items():
+            if not _is_delta(value):
+                continue
+            deltas = []
+            while _is_delta(value): # Up to the nearest full copy...
+                deltas.append(value)
+                value = self._load_channel_values(thread_id, checkpoint_ns, value[_DELTA_KEY], memo).get(channel, [])
+            value = list(value)
+            for delta in reversed(deltas): # ...then replay the appends
+                value = value[:delta["offset"]] + list(delta["items"])
+            channel_values[channel] = value
+            chain = max(chain, len(deltas))
+        checkpoint = {**checkpoint_tuple.checkpoint, "channel_values": channel_values}
+        return checkpoint_tuple._replace(checkpoint=checkpoint), chain
+
+    # --- Sync API (used by get_state/update_state)
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        checkpoint_tuple, chain = self._decode_deltas(super().get_tuple(config), {})
+        if checkpoint_tuple and not config["configurable"].get("checkpoint_id"):
+            # Latest checkpoint, i.e. what a resumed run continues from: its next write can be a delta
+            configurable = checkpoint_tuple.config["configurable"]
+            self._remember_head((str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")),
+                                configurable["checkpoint_id"], chain, checkpoint_tuple.checkpoint["channel_values"])
+        if checkpoint_tuple and not config["configurable"].get("checkpoint_ns"):
+            self._touch(str(config["configurable"]["thread_id"]))
+        return checkpoint_tuple
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        # Materialized first: the parent lookups need the connection lock the stock generator holds
+        memo: Dict[str, dict] = {}
+        for checkpoint_tuple in list(super().list(config, filter=filter, before=before, limit=limit)):
+            yield self._decode_deltas(checkpoint_tuple, memo)[0]
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        stored, chain = self._encode_deltas(config, checkpoint) if self.delta_channels else (checkpoint, 0)
+        next_config = super().put(config, stored, metadata, new_versions)
+        if self.delta_channels:
+            self._remember_head((str(config["configurable"]["thread_id"]), config["configurable"].get("checkpoint_ns", "")),
+                                checkpoint["id"], chain, checkpoint["channel_values"])
+        if not config["configurable"].get("checkpoint_ns"): # Subgraph checkpoints do not decide whether the thread is finished
+            finished = bool(self.finished_channel and checkpoint["channel_values"].get(self.finished_channel))
+            self._touch(str(config["configurable"]["thread_id"]), finished=finished)
+        self._maybe_sweep()
+        return next_config
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.cursor() as cur:
+            self._delete_threads(cur, [str(thread_id)])
+
+    def latest_checkpoint_id(self, thread_id: str) -> Optional[str]:
+        """Id of the thread's newest root checkpoint, without loading it (e.g. to validate a cached snapshot)."""
+        with self.cursor(transaction=False) as cur:
+            cur.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' ORDER BY checkpoint_id DESC LIMIT 1",
+                (str(thread_id),),
+            )
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    # --- Async API (used by ainvoke/astream)
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def alatest_checkpoint_id(self, thread_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.latest_checkpoint_id, thread_id)
+
+
+def get_checkpointer(backend: str = checkpointer_backend) -> BaseCheckpointSaver:
+    if backend == "memory":
+        if api_workers > 1:
+            raise ValueError("CHECKPOINTER_BACKEND=memory cannot be shared between workers; use sqlite when API_WORKERS > 1.")
+        return MemorySaver() # Unbounded, lost on restart; fine for notebooks and local experiments
+    if backend == "sqlite":
+        return BoundedSqliteSaver.from_path(checkpoint_db_path)
+    raise ValueError(f"Unknown CHECKPOINTER_BACKEND: {backend}")
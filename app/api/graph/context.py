@@ -0,0 +1,192 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from app.api.core.config import context_passage_tokens
+from app.api.core.documents import DocumentRecord, document_store
+from .retrieval import BM25Index
+
+# Token-budgeted context assembly for generate_answer / write_section.
+# `context` in InterviewState is a list that only ever grows. Search nodes add references to documents of
+# the thread's document pool (documents.py): {"doc": id, "passages": [passage indices] or None for all}.
+# Threads checkpointed before the pool existed hold pre-formatted '<Document ...>' blocks instead; both are
+# accepted. Instead of pasting all of it into every prompt, we resolve it into DocumentRecords, drop
+# duplicates, rank their passages against the current question and keep the best ones that fit the token
+# budget. Passages are slices of the record's content; prompt text is only built for the selected ones.
+
+DOCUMENT_SEPARATOR = "\n\n---\n\n"
+_DOCUMENT_RE = re.compile(r'<Document (?P<attrs>[^>]*?)\s*/>\n(?P<content>.*?)\n</Document>', re.DOTALL)
+_ATTR_RE = re.compile(r'(\w+)="([^"]*)"')
+_PARAGRAPH_RE = re.compile(r"(?:(?!\n\s*\n|\n(?==)).)+", re.DOTALL) # Text between blank lines / before '== heading'
+_SENTENCE_RE = re.compile(r".+?(?:[.!?](?=\s)|$)", re.DOTALL)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base") # gpt-4o family tokenizer
+    except Exception: # tiktoken missing, or its encoding file cannot be downloaded (offline)
+        return None
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4) # Rough estimate for English text
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def passage_spans(text: str, max_tokens: int = context_passage_tokens) -> List[Tuple[int, int]]:
+    """(start, end) spans packing paragraphs (or sentences, for very long paragraphs) into passages of at most ~max_tokens."""
+    units = []
+    # Wikipedia extracts mark headings with '== ... =='
+    for paragraph in _PARAGRAPH_RE.finditer(text):
+        start, end = _strip_span(text, paragraph.start(), paragraph.end())
+        if start == end:
+            continue
+        if count_tokens(text[start:end]) <= max_tokens:
+            units.append((start, end))
+        else:
+            units.extend(_strip_span(text, start + m.start(), start + m.end()) for m in _SENTENCE_RE.finditer(text[start:end]))
+
+    spans, current_start, current_end, current_tokens = [], None, None, 0
+    for start, end in units:
+        unit_tokens = count_tokens(text[start:end])
+        if current_start is not None and current_tokens + unit_tokens > max_tokens:
+            spans.append((current_start, current_end))
+            current_start, current_tokens = None, 0
+        if current_start is None:
+            current_start = start
+        current_end = end
+        current_tokens += unit_tokens
+    if current_start is not None:
+        spans.append((current_start, current_end))
+    return spans
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def split_passages(text: str, max_tokens: int = context_passage_tokens) -> List[str]:
+    return [text[start:end] for start, end in passage_spans(text, max_tokens)]
+
+def _with_offsets(record: DocumentRecord) -> DocumentRecord:
+    if record.passage_offsets is None:
+        record.passage_offsets = tuple(passage_spans(record.content))
+    return record
+
+def make_record(kind: str, source: str, title: str, content: str) -> DocumentRecord:
+    return _with_offsets(DocumentRecord(kind, source, title, content))
+
+
+def _legacy_records(entry: str) -> List[DocumentRecord]:
+    # '<Document ...>' blocks of contexts checkpointed before the document pool
+    records = []
+    for match in _DOCUMENT_RE.finditer(entry):
+        attr_map = dict(_ATTR_RE.findall(match.group("attrs")))
+        kind, source = ("web", attr_map["href"]) if "href" in attr_map else ("wikipedia", attr_map.get("source") or match.group("attrs"))
+        content = match.group("content").strip()
+        if content:
+            records.append(make_record(kind, source, "", content))
+    return records
+
+async def resolve_context(context: List[Any], pool: str = "") -> List[Tuple[DocumentRecord, Optional[List[int]]]]:
+    """(record, passage indices or None for all) per document of `context`, deduplicated by source,
+    in first-reference order. All references to one document are merged."""
+    references = [entry for entry in context if isinstance(entry, dict)]
+    stored = await document_store.aget_documents(pool, list(dict.fromkeys(ref["doc"] for ref in references))) if references else {}
+    order: List[str] = []
+    records: Dict[str, DocumentRecord] = {}
+    selected: Dict[str, Optional[set]] = {}
+    for entry in context:
+        if isinstance(entry, dict):
+            record = stored.get(entry["doc"])
+            candidates = [(record, entry.get("passages"))] if record is not None else []
+        else:
+            candidates = [(record, None) for record in _legacy_records(entry)]
+        for record, passages in candidates:
+            key = record.source
+            if key in records and records[key].doc_id != record.doc_id:
+                continue # Another document from the same source came first
+            if key not in records:
+                order.append(key)
+                records[key] = _with_offsets(record)
+                selected[key] = set()
+            if passages is None or selected[key] is None:
+                selected[key] = None
+            else:
+                selected[key].update(passages)
+    return [
+        (records[key], sorted(i for i in selected[key] if i < len(records[key].passage_offsets)) if selected[key] is not None else None)
+        for key in order
+    ]
+
+async def context_texts(context: List[Any], pool: str = "") -> List[str]:
+    """Plain text of the referenced passages of each document (e.g. for novelty scoring)."""
+    texts = []
+    for record, passages in await resolve_context(context, pool):
+        indices = passages if passages is not None else range(len(record.passage_offsets))
+        texts.append("\n".join(record.passage(i) for i in indices))
+    return texts
+
+
+def rank_passages(documents: List[Tuple[DocumentRecord, Optional[List[int]]]], query: str) -> List[tuple]:
+    """All allowed passages of `documents` as (doc_index, passage_index, text), most relevant to `query` (BM25) first."""
+    passages = [
+        (doc_index, passage_index, record.passage(passage_index))
+        for doc_index, (record, allowed) in enumerate(documents)
+        for passage_index in (allowed if allowed is not None else range(len(record.passage_offsets)))
+    ]
+    if not passages:
+        return []
+    # Stable ranking: ties keep document order, i.e. the search engine's own ranking
+    order = BM25Index([p[2] for p in passages]).top_k(query, len(passages))
+    return [passages[i] for i in order]
+
+def _render_selection(documents: List[Tuple[DocumentRecord, Optional[List[int]]]], selected: Dict[int, List[tuple]]) -> str:
+    rendered = []
+    for doc_index in sorted(selected):
+        passages = [p for _, p in sorted(selected[doc_index])] # Original reading order within a document
+        rendered.append(documents[doc_index][0].render(passages))
+    return DOCUMENT_SEPARATOR.join(rendered)
+
+async def reference_documents(pool: str, records: List[DocumentRecord], query: str, top_k: int) -> List[Dict[str, Any]]:
+    """Adds `records` to the thread's pool and returns context references to them: the top_k passages for
+    `query`, or whole documents if top_k <= 0. Duplicates of pooled documents become references to those."""
+    doc_ids = list(dict.fromkeys(await document_store.aadd_documents(pool, records)))
+    if top_k <= 0:
+        return [{"doc": doc_id, "passages": None} for doc_id in doc_ids]
+    stored = await document_store.aget_documents(pool, doc_ids)
+    doc_ids = [doc_id for doc_id in doc_ids if doc_id in stored]
+    documents = [(_with_offsets(stored[doc_id]), None) for doc_id in doc_ids]
+    selected: Dict[int, List[int]] = {}
+    for doc_index, passage_index, _ in rank_passages(documents, query)[:top_k]:
+        selected.setdefault(doc_index, []).append(passage_index)
+    return [{"doc": doc_ids[doc_index], "passages": sorted(selected[doc_index])} for doc_index in sorted(selected)]
+
+
+async def assemble_context(context: List[Any], query: str, token_budget: int, pool: str = "") -> str:
+    """Renders the most relevant passages of `context` for `query`, within `token_budget` tokens.
+
+    Documents keep the original '<Document ...>' header so the prompts' citation rules still apply.
+    A budget <= 0 disables the budget (every referenced passage).
+    """
+    documents = await resolve_context(context, pool)
+    selected: Dict[int, List[tuple]] = {}
+    if token_budget <= 0:
+        for doc_index, (record, allowed) in enumerate(documents):
+            indices = allowed if allowed is not None else range(len(record.passage_offsets))
+            selected[doc_index] = [(i, record.passage(i)) for i in indices]
+        return _render_selection(documents, selected)
+
+    used_tokens = 0
+    for doc_index, passage_index, passage in rank_passages(documents, query):
+        tokens = count_tokens(passage)
+        header_tokens = 0 if doc_index in selected else count_tokens(documents[doc_index][0].attrs) + 8
+        if used_tokens + tokens + header_tokens > token_budget:
+            continue
+        selected.setdefault(doc_index, []).append((passage_index, passage))
+        used_tokens += tokens + header_tokens
+    return _render_selection(documents, selected)
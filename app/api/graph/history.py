@@ -0,0 +1,48 @@
+import re
+from typing import List, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from app.api.core.config import conversation_window_exchanges
+from .schemas import InterviewState
+
+# Sliding-window view of an interview for the prompts of generate_question / create_search_query / generate_answer.
+# Interview messages are: the opening HumanMessage, then (analyst question, expert answer) pairs.
+# With the window enabled, prompts get the opening turn, a running summary of older turns and the last N
+# exchanges, so prompt size stops growing with max_num_turns.
+# The summary is extractive (first sentences of each turn): building it costs no extra LLM round trip.
+
+SUMMARY_SENTENCES = {"analyst": 1, "expert": 2}
+SUMMARY_MAX_CHARS = 400
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _summarize_message(message: BaseMessage) -> str:
+    role = "expert" if isinstance(message, AIMessage) and message.name == "expert" else "analyst"
+    text = " ".join(str(message.content).split())
+    summary = " ".join(_SENTENCE_END_RE.split(text)[:SUMMARY_SENTENCES[role]])[:SUMMARY_MAX_CHARS]
+    return f"- {role.capitalize()}: {summary}"
+
+def conversation_window(state: InterviewState, window_exchanges: int = conversation_window_exchanges) -> Tuple[List[BaseMessage], dict]:
+    """Returns (messages to send, state update that keeps the running summary current).
+
+    window_exchanges <= 0 disables the window: all messages, no state update.
+    """
+    messages = state["messages"]
+    if window_exchanges <= 0:
+        return list(messages), {}
+
+    # Ends with an expert answer -> keep the last N pairs; ends with a question -> also keep that question
+    tail = 2 * window_exchanges + (len(messages) - 1) % 2
+    older_end = max(1, len(messages) - tail) # messages[1:older_end] fall outside the window
+    if older_end <= 1:
+        return list(messages), {}
+
+    summary = state.get("history_summary") or ""
+    summarized = state.get("summarized_messages") or 0
+    update = {}
+    if 1 + summarized < older_end: # Fold turns that just left the window into the running summary
+        new_lines = [_summarize_message(m) for m in messages[1 + summarized:older_end]]
+        summary = "\n".join(filter(None, [summary] + new_lines))
+        update = {"history_summary": summary, "summarized_messages": older_end - 1}
+
+    summary_message = SystemMessage(content=f"Summary of the earlier part of this interview:\n{summary}")
+    return [messages[0], summary_message] + list(messages[older_end:]), update
@@ -1,21 +1,29 @@
 from langgraph.graph import StateGraph, START, END
-from .schemas import InterviewState
+from app.api.core.config import report_mode
+from app.api.core.tracing import traced_node
+from .schemas import InterviewState, InterviewOutputState
 from .nodes import (
     generate_question, create_search_query, web_search, search_wikipedia,
-    generate_answer, save_interview, route_messages, write_section
+    generate_answer, save_interview, route_messages, write_section, write_report_fragment, route_interview_start
 )
 
 def get_interview_graph_builder(): # Returns builder, compilation happens in research_graph
-    interview_builder = StateGraph(InterviewState)
-    interview_builder.add_node("ask_question", generate_question)
-    interview_builder.add_node("create_search_query", create_search_query)
-    interview_builder.add_node("web_search", web_search)
-    interview_builder.add_node("search_wikipedia", search_wikipedia)
-    interview_builder.add_node("generate_answer", generate_answer)
-    interview_builder.add_node("save_interview", save_interview)
-    interview_builder.add_node("write_section", write_section)
+    interview_builder = StateGraph(InterviewState, output=InterviewOutputState)
+    # All I/O nodes are async, so parallel interviews share the event loop instead of the thread pool.
+    # traced_node records each run (latency, tokens, cost, cache hits) for /metrics and /research/{thread_id}/trace
+    interview_builder.add_node("ask_question", traced_node("ask_question", generate_question))
+    interview_builder.add_node("create_search_query", traced_node("create_search_query", create_search_query))
+    interview_builder.add_node("web_search", traced_node("web_search", web_search))
+    interview_builder.add_node("search_wikipedia", traced_node("search_wikipedia", search_wikipedia))
+    interview_builder.add_node("generate_answer", traced_node("generate_answer", generate_answer))
+    interview_builder.add_node("save_interview", traced_node("save_interview", save_interview))
+    interview_builder.add_node("write_section", traced_node("write_section", write_section))
 
-    interview_builder.add_edge(START, "ask_question")
+    interview_builder.add_conditional_edges(
+        START,
+        route_interview_start, # Prefetched first turn -> straight to generate_answer
+        {"ask_question": "ask_question", "generate_answer": "generate_answer"}
+    )
     interview_builder.add_edge("ask_question", "create_search_query")
     
     # Parallel search paths - after create_search_query, both web_search and search_wikipedia can run
@@ -33,7 +41,13 @@ def get_interview_graph_builder(): # Returns builder, compilation happens in res
         {"ask_question": "ask_question", "save_interview": "save_interview"}
     )
     interview_builder.add_edge("save_interview", "write_section")
-    interview_builder.add_edge("write_section", END)
+    if report_mode == "progressive":
+        # The interview also writes its passage of the report, so write_report only has to merge them
+        interview_builder.add_node("write_report_fragment", traced_node("write_report_fragment", write_report_fragment))
+        interview_builder.add_edge("write_section", "write_report_fragment")
+        interview_builder.add_edge("write_report_fragment", END)
+    else:
+        interview_builder.add_edge("write_section", END)
     
     return interview_builder
 
@@ -1,26 +1,40 @@
+import time
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, get_buffer_string
-from langchain_community.document_loaders import WikipediaLoader
 from .schemas import GenerateAnalystsState, Perspectives, InterviewState, SearchQuery, Analyst, ResearchGraphState
 from app.api.core.config import (
-    llm, tavily_search,max_interview_turns,
+    get_llm, tavily_search,max_interview_turns, deadline_wrapup_seconds,
+    answer_context_token_budget, section_context_token_budget, retrieval_top_k_passages, report_digest_enabled,
+    report_mode, report_fragment_instructions_template, novelty_stop_threshold, novelty_min_turns,
     analyst_instructions_template, question_instructions_template,
     search_instructions_content, answer_instructions_template,
     section_writer_instructions_template, report_writer_instructions_template,
     intro_conclusion_instructions_template
 )
+from app.api.core.wikipedia import aload_wikipedia
+from app.api.core.cache import cached_search
+from app.api.core.scheduler import ainvoke_llm, ainvoke_search, INTERACTIVE
+from .context import assemble_context, context_texts, make_record, reference_documents
+from .history import conversation_window
+from .novelty import answer_novelty
+from .report import format_sections, digest_sections, split_report_body, parse_sources, merge_report_fragments
 
 
-def create_analysts(state: GenerateAnalystsState) -> dict:
+async def create_analysts(state: GenerateAnalystsState) -> dict:
     system_prompt = analyst_instructions_template.format(
         topic=state['topic'],
         human_analyst_feedback=state.get('human_analyst_feedback', ''),
         max_analysts=state['max_analysts']
     )
-    structured_llm = llm.with_structured_output(Perspectives)
-    response = structured_llm.invoke([SystemMessage(content=system_prompt)] + [HumanMessage(content="Generate the set of analysts.")])
-    return {'analysts': response.analysts, 'human_analyst_feedback': state.get('human_analyst_feedback', None)} # pass feedback along
+    structured_llm, fallback = get_llm("create_analysts", Perspectives)
+    response = await ainvoke_llm(
+        structured_llm, [SystemMessage(content=system_prompt)] + [HumanMessage(content="Generate the set of analysts.")],
+        priority=INTERACTIVE, # The user is waiting on these (/start and analyst feedback)
+        fallback=fallback
+    )
+    # The model sometimes returns more personas than asked for; each one would be another interview
+    return {'analysts': response.analysts[:state['max_analysts']], 'human_analyst_feedback': state.get('human_analyst_feedback', None)} # pass feedback along
 
-def human_feedback_node(state: GenerateAnalystsState) -> dict: 
+async def human_feedback_node(state: GenerateAnalystsState) -> dict: 
     """Dummy no-op node, state passes through."""
     return {} # No changes to state from this node itself
 
@@ -32,48 +46,80 @@ def should_continue_analyst_generation(state: GenerateAnalystsState) -> str:
 
 
 # --- Interview Graph Nodes 
-def generate_question(state: InterviewState) -> dict:
+def opening_message(topic: str) -> HumanMessage:
+    # First message of every interview
+    return HumanMessage(content=f"So you said you were writing an article on {topic}?")
+
+def route_interview_start(state: InterviewState) -> str:
+    # Interviews whose first question and searches were prefetched (speculation.py) start at the answer
+    return "generate_answer" if state.get("search_query") else "ask_question"
+
+async def generate_question(state: InterviewState) -> dict:
     system_prompt = question_instructions_template.format(goals=state['analyst'].persona)
-    response = llm.invoke([SystemMessage(content=system_prompt)] + state['messages'])
-    return {'messages': [response]} # Append new message
+    messages, history_update = conversation_window(state)
+    model, fallback = get_llm("ask_question")
+    response = await ainvoke_llm(model, [SystemMessage(content=system_prompt)] + messages, fallback=fallback)
+    return {'messages': [response], **history_update} # Append new message
 
-def create_search_query(state: InterviewState) -> dict:
+async def create_search_query(state: InterviewState) -> dict:
     search_sys_message = SystemMessage(content=search_instructions_content)
-    llm_with_structured_output = llm.with_structured_output(SearchQuery)
-    response = llm_with_structured_output.invoke([search_sys_message] + state['messages'])
-    return {'search_query': response.search_query}
+    llm_with_structured_output, fallback = get_llm("create_search_query", SearchQuery)
+    messages, history_update = conversation_window(state)
+    response = await ainvoke_llm(llm_with_structured_output, [search_sys_message] + messages, fallback=fallback)
+    return {'search_query': response.search_query, **history_update}
 
-def web_search(state: InterviewState) -> dict:
+def _retrieval_query(state: InterviewState) -> str:
+    # What the passages are ranked against: the analyst's latest question plus the generated search query
+    return f"{state['messages'][-1].content}\n{state['search_query']}"
+
+async def web_search(state: InterviewState) -> dict:
     search_query = state['search_query']
-    search_docs_raw = tavily_search.invoke(search_query)
-    formatted_search_docs = "\n\n---\n\n".join(
-        [f'<Document href="{doc["url"]}" />\n{doc["content"]}\n</Document>' for doc in search_docs_raw]
-    )
-    return {"context": [formatted_search_docs]}
+    search_docs_raw = await cached_search("tavily", search_query, lambda: ainvoke_search(lambda: tavily_search.ainvoke(search_query)))
+    documents = [make_record("web", doc["url"], doc.get("title", ""), doc["content"]) for doc in search_docs_raw]
+    # Stored once in the thread's document pool; the interview keeps references to its best passages
+    references = await reference_documents(state.get("document_pool", ""), documents, _retrieval_query(state), retrieval_top_k_passages)
+    return {"context": references}
+
+async def _fetch_wikipedia(search_query: str) -> list:
+    docs = await aload_wikipedia(search_query, load_max_docs=3) # Non-blocking replacement for WikipediaLoader.load()
+    return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs] # Plain dicts so they can be cached
 
-def search_wikipedia(state: InterviewState) -> dict:
+async def search_wikipedia(state: InterviewState) -> dict:
     search_query = state['search_query']
-    loader = WikipediaLoader(query=search_query, load_max_docs=3) 
-    docs = loader.load()
-    formatted_search_docs = "\n\n---\n\n".join(
-        [f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}" />\n{doc.page_content}\n</Document>' for doc in docs]
-    )
-    return {"context": [formatted_search_docs]}
+    docs = await cached_search("wikipedia", search_query, lambda: _fetch_wikipedia(search_query))
+    documents = [
+        make_record("wikipedia", doc["metadata"]["source"], doc["metadata"].get("title", ""), doc["page_content"])
+        for doc in docs
+    ]
+    # Whole pages are mostly off-topic for one question; keep only the best passages
+    references = await reference_documents(state.get("document_pool", ""), documents, _retrieval_query(state), retrieval_top_k_passages)
+    return {"context": references}
     
-def generate_answer(state: InterviewState) -> dict:
+async def generate_answer(state: InterviewState) -> dict:
     analyst = state["analyst"]
     messages = state["messages"]
-    context = state["context"] # This should be a string by now
-    
-    # Ensure context is a single string
-    full_context_str = "\n\n".join(context) if isinstance(context, list) else context
+    context = state["context"]
+
+    # Only the passages most relevant to the analyst's latest question, within the token budget
+    question = f"{messages[-1].content}\n{state.get('search_query', '')}"
+    full_context_str = await assemble_context(context, question, answer_context_token_budget, pool=state.get("document_pool", ""))
 
     system_message_content = answer_instructions_template.format(goals=analyst.persona, context=full_context_str)
-    answer = llm.invoke([SystemMessage(content=system_message_content)] + messages)
+    window, history_update = conversation_window(state)
+    model, fallback = get_llm("generate_answer")
+    answer = await ainvoke_llm(model, [SystemMessage(content=system_message_content)] + window, fallback=fallback)
     answer.name = "expert"
-    return {"messages": [answer]}
 
-def save_interview(state: InterviewState) -> dict:
+    update = {"messages": [answer], "num_expert_answers": state.get("num_expert_answers", 0) + 1, **history_update}
+    if novelty_stop_threshold > 0: # Only route_messages reads it, and only when stopping on novelty is on
+        # How much this answer adds over earlier answers and the context retrieved for earlier turns
+        earlier_answers = [m.content for m in messages if isinstance(m, AIMessage) and m.name == "expert"]
+        earlier_context = await context_texts(context[:state.get("context_seen", 0)], state.get("document_pool", ""))
+        update["answer_novelty"] = answer_novelty(answer.content, earlier_answers + earlier_context)
+        update["context_seen"] = len(context)
+    return update
+
+async def save_interview(state: InterviewState) -> dict:
     messages = state["messages"]
     interview_str = get_buffer_string(messages)
     return {"interview": interview_str}
@@ -81,10 +127,22 @@ def save_interview(state: InterviewState) -> dict:
 def route_messages(state: InterviewState, name: str = "expert") -> str:
     messages = state["messages"]
     max_num_turns = state.get('max_num_turns', max_interview_turns)
-    num_responses = len([m for m in messages if isinstance(m, AIMessage) and m.name == name])
+    num_responses = state.get("num_expert_answers")
+    if num_responses is None: # Interviews checkpointed before the counter existed
+        num_responses = len([m for m in messages if isinstance(m, AIMessage) and m.name == name])
 
     if num_responses >= max_num_turns:
         return 'save_interview'
+
+    # Converged: the latest answer mostly repeats what the interview already has
+    novelty = state.get("answer_novelty")
+    if novelty_stop_threshold > 0 and novelty is not None and num_responses >= novelty_min_turns and novelty < novelty_stop_threshold:
+        return 'save_interview'
+
+    # Close to the run's deadline: stop asking and write up what we have, so the report still gets written
+    deadline_at = state.get("deadline_at")
+    if deadline_at is not None and time.time() >= deadline_at - deadline_wrapup_seconds:
+        return 'save_interview'
     
     # Check last *analyst* question (which would be messages[-2] if expert just answered)
     # The router runs after generate_answer, so messages[-1] is expert's answer, messages[-2] is analyst's question
@@ -95,20 +153,32 @@ def route_messages(state: InterviewState, name: str = "expert") -> str:
                 return 'save_interview'
     return "ask_question"
 
-def write_section(state: InterviewState) -> dict:
+async def write_section(state: InterviewState) -> dict:
     interview = state["interview"]
     context = state["context"] # Context used for RAG
     analyst = state["analyst"]
     
-    full_context_str = "\n\n".join(context) if isinstance(context, list) else context
+    # Rank against the analyst's focus and the whole interview, so the section covers what was discussed
+    full_context_str = await assemble_context(context, f"{analyst.description}\n{interview}", section_context_token_budget,
+                                        pool=state.get("document_pool", ""))
 
     system_message_content = section_writer_instructions_template.format(focus=analyst.description)
-    section = llm.invoke([
+    model, fallback = get_llm("write_section")
+    section = await ainvoke_llm(model, [
         SystemMessage(content=system_message_content),
         HumanMessage(content=f"Use these sources: {full_context_str}\n\nAnd this expert interview: {interview}")
-    ])
+    ], fallback=fallback)
     return {"sections": [section.content]} # This will be aggregated by operator.add
 
+async def write_report_fragment(state: InterviewState) -> dict:
+    # REPORT_MODE=progressive: this interview's passage of the final report, written while other interviews still run
+    section = state["sections"][-1]
+    instructions = report_fragment_instructions_template.format(topic=state.get("topic", ""), section=section)
+    model, fallback = get_llm("write_report_fragment")
+    passage = await ainvoke_llm(model, [SystemMessage(content=instructions)] + [HumanMessage(content="Write the report passage for this memo.")], fallback=fallback)
+    body, _ = split_report_body(passage.content) # In case the model added headers or a source list anyway
+    return {"report_fragments": [{"analyst": state["analyst"].name, "body": body, "sources": parse_sources(section)}]}
+
 
 
 from langgraph.constants import Send # For initiate_all_interviews
@@ -120,70 +190,63 @@ def initiate_all_interviews_conditional(state: ResearchGraphState): # This is th
     else:
         # Proceed to conduct interviews in parallel
         topic = state["topic"]
+        prefetched = state.get("prefetched_interviews") or {}
         return [
             Send(
                 "conduct_interview",
                 {
                     "analyst": analyst,
-                    "messages": [HumanMessage(content=f"So you said you were writing an article on {topic}?")],
+                    "messages": [opening_message(topic)],
                     "max_num_turns": state.get("max_num_turns_interview", max_interview_turns), # Allow configuring interview turns
                     "context": [], # Initialize context for interview
-                    "sections": [] # Initialize sections for interview
+                    "sections": [], # Initialize sections for interview
+                    "report_fragments": [],
+                    "topic": topic,
+                    "num_expert_answers": 0,
+                    "dispatched_at": time.time(),
+                    "deadline_at": state.get("deadline_at"),
+                    "document_pool": state.get("document_pool", ""), # Shared by all interviews of the thread
+                    **prefetched.get(analyst.name, {}) # messages, search_query and context of the first turn
                 }
             ) for analyst in state["analysts"]
         ]
 
-def write_report(state: ResearchGraphState) -> dict:
+async def assemble_sections(state: ResearchGraphState) -> dict:
+    # Formats the sections once for the three report writers that run after it
     sections = state["sections"]
+    formatted_str_sections = format_sections(sections)
+    # With the digest off, write_introduction / write_conclusion read formatted_sections instead of a second copy
+    digest = digest_sections(sections) if report_digest_enabled else ""
+    return {"formatted_sections": formatted_str_sections, "sections_digest": digest}
+
+async def write_report(state: ResearchGraphState) -> dict:
+    fragments = state.get("report_fragments")
+    if report_mode == "progressive" and fragments: # The passages are already written, only merge them
+        return {"content": merge_report_fragments(fragments, [analyst.name for analyst in state["analysts"]])}
     topic = state["topic"]
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
-    system_message_content = report_writer_instructions_template.format(topic=topic, context=formatted_str_sections)
-    report = llm.invoke([SystemMessage(content=system_message_content)] + [HumanMessage(content="Write a report based upon these memos.")])
+    system_message_content = report_writer_instructions_template.format(topic=topic, context=state["formatted_sections"])
+    model, fallback = get_llm("write_report")
+    report = await ainvoke_llm(model, [SystemMessage(content=system_message_content)] + [HumanMessage(content="Write a report based upon these memos.")], fallback=fallback)
     return {"content": report.content}
 
-def write_introduction(state: ResearchGraphState) -> dict:
-    sections = state["sections"]
+async def write_introduction(state: ResearchGraphState) -> dict:
     topic = state["topic"]
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
-    instructions = intro_conclusion_instructions_template.format(topic=topic, formatted_str_sections=formatted_str_sections)
-    intro = llm.invoke([SystemMessage(content=instructions)] + [HumanMessage(content="Write the report introduction")])
+    instructions = intro_conclusion_instructions_template.format(topic=topic, formatted_str_sections=state.get("sections_digest") or state["formatted_sections"])
+    model, fallback = get_llm("write_introduction")
+    intro = await ainvoke_llm(model, [SystemMessage(content=instructions)] + [HumanMessage(content="Write the report introduction")], fallback=fallback)
     return {"introduction": intro.content}
 
-def write_conclusion(state: ResearchGraphState) -> dict:
-    sections = state["sections"]
+async def write_conclusion(state: ResearchGraphState) -> dict:
     topic = state["topic"]
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
-    instructions = intro_conclusion_instructions_template.format(topic=topic, formatted_str_sections=formatted_str_sections)
-    conclusion = llm.invoke([SystemMessage(content=instructions)] + [HumanMessage(content="Write the report conclusion")])
+    instructions = intro_conclusion_instructions_template.format(topic=topic, formatted_str_sections=state.get("sections_digest") or state["formatted_sections"])
+    model, fallback = get_llm("write_conclusion")
+    conclusion = await ainvoke_llm(model, [SystemMessage(content=instructions)] + [HumanMessage(content="Write the report conclusion")], fallback=fallback)
     return {"conclusion": conclusion.content}
 
-def finalize_report(state: ResearchGraphState) -> dict:
-    content = state["content"]
-    # Parsing logic from notebook
-    if content.startswith("## Insights"): # Ensure it's ## Insights as per prompt
-        # Find the start of "## Insights" and take everything after it.
-        # This handles cases where there might be leading whitespace or other text if LLM is not perfectly compliant.
-        insights_marker = "## Insights"
-        insights_start_index = content.find(insights_marker)
-        if insights_start_index != -1:
-            content_body = content[insights_start_index + len(insights_marker):].strip()
-        else: # Fallback if marker not found
-            content_body = content 
-
-    sources_marker = "\n## Sources\n" # More robust split
-    if sources_marker in content_body:
-        try:
-            # Split based on the last occurrence of sources_marker to be safe
-            parts = content_body.rsplit(sources_marker, 1)
-            content_main = parts[0]
-            sources_text = parts[1] if len(parts) > 1 else None
-        except Exception:
-            content_main = content_body # Fallback
-            sources_text = None
-    else:
-        content_main = content_body
-        sources_text = None
-    
+async def finalize_report(state: ResearchGraphState) -> dict:
+    # Drop the '## Insights' header and move the sources after the conclusion
+    content_main, sources_text = split_report_body(state["content"])
+
     final_report_parts = [state["introduction"]]
     if content_main: # Add content if it exists
       final_report_parts.append(content_main)
@@ -0,0 +1,27 @@
+import re
+from typing import Iterable, Set
+from app.api.core.config import novelty_shingle_size
+
+# Convergence detection for interviews (used by generate_answer / route_messages).
+# An expert answer's novelty is the share of its word n-grams (shingles) that appear neither in earlier
+# expert answers nor in the context retrieved for earlier turns. Once answers mostly repeat what the
+# interview already has, further turns cost LLM round trips without adding material for the section.
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str, size: int = novelty_shingle_size) -> Set[tuple]:
+    words = _WORD_RE.findall(str(text).lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def answer_novelty(answer: str, known_texts: Iterable[str], size: int = novelty_shingle_size) -> float:
+    """Share (0..1) of the answer's shingles not found in `known_texts`. An empty answer counts as not novel."""
+    answer_shingles = shingles(answer, size)
+    if not answer_shingles:
+        return 0.0
+    known: Set[tuple] = set()
+    for text in known_texts:
+        known |= shingles(text, size)
+    return len(answer_shingles - known) / len(answer_shingles)
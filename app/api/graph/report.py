@@ -0,0 +1,117 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.api.core.config import report_digest_words
+
+# Report assembly helpers for assemble_sections / finalize_report.
+# Sections are the analysts' memos ('## Title', '### Summary', '### Sources', see section_writer_instructions).
+# write_report needs their full text, but the introduction and conclusion only preview / recap them, so
+# they can be written from a digest: each memo's title and the opening of its summary, without sources.
+
+SECTION_SEPARATOR = "\n\n"
+_CITATION_RE = re.compile(r"\s*\[\d+(?:\s*,\s*\d+)*\]")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_CITATION_NUMBERS_RE = re.compile(r"\[(\d+(?:\s*,\s*\d+)*)\]")
+_SOURCE_LINE_RE = re.compile(r"^\[(\d+)\]\s*(.+?)\s*$")
+
+
+def format_sections(sections: List[str]) -> str:
+    return SECTION_SEPARATOR.join(f"{section}" for section in sections)
+
+def _section_parts(section: str) -> Tuple[str, str]:
+    """(title, summary text) of a memo. Falls back gracefully when the memo does not follow the template."""
+    title, body_lines = "", []
+    for line in section.strip().splitlines():
+        stripped = line.strip()
+        if stripped.startswith("## ") and not title:
+            title = stripped[3:].strip()
+        elif stripped.lower().startswith("### sources"):
+            break # Sources are not needed to preview or recap the report
+        elif not stripped.startswith("#"):
+            body_lines.append(stripped)
+    return title, " ".join(line for line in body_lines if line)
+
+def digest_section(section: str, max_words: int = report_digest_words) -> str:
+    title, summary = _section_parts(section)
+    summary = _CITATION_RE.sub("", summary)
+    digest, words = [], 0
+    for sentence in _SENTENCE_END_RE.split(summary): # Whole sentences, up to about max_words
+        if digest and words + len(sentence.split()) > max_words:
+            break
+        digest.append(sentence)
+        words += len(sentence.split())
+    return f"## {title}\n{' '.join(digest)}" if title else " ".join(digest)
+
+def digest_sections(sections: List[str], max_words: int = report_digest_words) -> str:
+    return SECTION_SEPARATOR.join(digest_section(section, max_words) for section in sections)
+
+
+def split_report_body(content: str) -> Tuple[str, Optional[str]]:
+    """Splits write_report's output into (body without the '## Insights' header, sources text or None)."""
+    body = content.strip()
+    insights = re.search(r"^##\s*Insights\s*$", body, re.MULTILINE)
+    if insights:
+        body = body[insights.end():].strip()
+    sources = None
+    matches = list(re.finditer(r"^##\s*Sources\s*$", body, re.MULTILINE))
+    if matches: # The last one, in case the body itself quotes a heading
+        sources = body[matches[-1].end():].strip() or None
+        body = body[:matches[-1].start()].strip()
+    return body, sources
+
+
+# REPORT_MODE=progressive: every interview turns its memo into a passage of the report as soon as it is written
+# (a "fragment": passage text plus the memo's numbered sources), and write_report merges the fragments.
+# Each memo numbers its sources from [1], so merging renumbers the citations against one deduplicated source list.
+
+def parse_sources(section: str) -> List[List]:
+    """[[number, source], ...] from the '### Sources' part of a memo."""
+    sources, in_sources = [], False
+    for line in section.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            in_sources = stripped.lstrip("#").strip().lower() == "sources"
+            continue
+        match = _SOURCE_LINE_RE.match(stripped) if in_sources else None
+        if match:
+            sources.append([int(match.group(1)), match.group(2)])
+    return sources
+
+def _source_key(source: str) -> str:
+    return source.strip().rstrip("/").lower()
+
+def _renumber_citations(text: str, numbering: Dict[int, int]) -> str:
+    def replace(match: "re.Match") -> str:
+        numbers = []
+        for number in match.group(1).split(","):
+            new_number = numbering.get(int(number))
+            if new_number is not None and new_number not in numbers:
+                numbers.append(new_number)
+        # A citation without an entry in the memo's sources cannot be mapped, so it is dropped
+        return f"[{', '.join(str(number) for number in numbers)}]" if numbers else ""
+    return _CITATION_NUMBERS_RE.sub(replace, text)
+
+def merge_report_fragments(fragments: List[dict], analyst_order: Sequence[str] = ()) -> str:
+    """The report body ('## Insights' + passages + '## Sources'), in the same shape write_report's LLM call produces."""
+    # Interviews finish in any order; analyst order keeps the report the same from run to run
+    position = {name: index for index, name in enumerate(analyst_order)}
+    ordered = sorted(fragments, key=lambda fragment: position.get(fragment.get("analyst"), len(position)))
+
+    global_numbers: Dict[str, int] = {}
+    sources: List[str] = []
+    passages = []
+    for fragment in ordered:
+        numbering = {}
+        for number, source in fragment.get("sources", []):
+            key = _source_key(source)
+            if key not in global_numbers:
+                sources.append(source.strip())
+                global_numbers[key] = len(sources)
+            numbering[number] = global_numbers[key]
+        passage = _renumber_citations(fragment["body"], numbering).strip()
+        if passage:
+            passages.append(passage)
+
+    report = "## Insights\n\n" + SECTION_SEPARATOR.join(passages)
+    if sources:
+        report += "\n\n## Sources\n" + "\n".join(f"[{number}] {source}  " for number, source in enumerate(sources, 1))
+    return report
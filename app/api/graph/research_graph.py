@@ -1,10 +1,12 @@
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
+from app.api.core.tracing import traced_node, traced_subgraph
+from app.api.core.admission import admitted_interview
+from .checkpointer import get_checkpointer
 from .schemas import ResearchGraphState
 from .nodes import (
     create_analysts, human_feedback_node, # from analyst generation logic
     initiate_all_interviews_conditional,  # conditional edge logic
-    write_report, write_introduction, write_conclusion, finalize_report
+    assemble_sections, write_report, write_introduction, write_conclusion, finalize_report
 )
 from .interview_graph import get_interview_graph_builder # To compile the interview sub-graph
 
@@ -16,17 +18,20 @@ def get_research_graph():
     builder = StateGraph(ResearchGraphState)
 
     # Nodes from analyst generation cycle + main research tasks
-    builder.add_node("create_analysts", create_analysts) 
-    builder.add_node("human_feedback_node", human_feedback_node) 
+    builder.add_node("create_analysts", traced_node("create_analysts", create_analysts)) 
+    builder.add_node("human_feedback_node", traced_node("human_feedback_node", human_feedback_node)) 
     
     # The interview graph is a node that processes one interview
     # The `initiate_all_interviews_conditional` will use Send to invoke it multiple times
-    builder.add_node("conduct_interview", compiled_interview_graph)
+    # Wrapped in a traced node; the subgraph still checkpoints and streams (subgraphs=True) as before.
+    # Each run first waits for a per-thread and a global interview slot (admission control)
+    builder.add_node("conduct_interview", admitted_interview(traced_subgraph("conduct_interview", compiled_interview_graph)))
     
-    builder.add_node("write_report", write_report)
-    builder.add_node("write_introduction", write_introduction)
-    builder.add_node("write_conclusion", write_conclusion)
-    builder.add_node("finalize_report", finalize_report)
+    builder.add_node("assemble_sections", traced_node("assemble_sections", assemble_sections))
+    builder.add_node("write_report", traced_node("write_report", write_report))
+    builder.add_node("write_introduction", traced_node("write_introduction", write_introduction))
+    builder.add_node("write_conclusion", traced_node("write_conclusion", write_conclusion))
+    builder.add_node("finalize_report", traced_node("finalize_report", finalize_report))
 
     builder.add_edge(START, "create_analysts")
     builder.add_edge("create_analysts", "human_feedback_node") # This is the interrupt point
@@ -49,17 +54,21 @@ def get_research_graph():
 
  
 
-    # The conduct_interview node will aggregate sections into the state
-    builder.add_edge("conduct_interview", "write_report")
-    builder.add_edge("conduct_interview", "write_introduction")
-    builder.add_edge("conduct_interview", "write_conclusion")
+    # The conduct_interview node will aggregate sections into the state.
+    # assemble_sections formats them once (plus the digest for intro/conclusion) for the three writers
+    builder.add_edge("conduct_interview", "assemble_sections")
+    builder.add_edge("assemble_sections", "write_report")
+    builder.add_edge("assemble_sections", "write_introduction")
+    builder.add_edge("assemble_sections", "write_conclusion")
     
     # This join ensures finalize_report runs after all three are done.
     builder.add_edge(["write_report", "write_introduction", "write_conclusion"], "finalize_report")
 
     builder.add_edge("finalize_report", END)
     
-    memory = MemorySaver()
+    # SQLite-backed (WAL) with TTL/LRU eviction by default; set CHECKPOINTER_BACKEND=memory for MemorySaver
+    memory = get_checkpointer()
+    # Nodes are coroutines (see nodes.py), so the compiled graph must be driven with ainvoke/astream.
     # The main graph is compiled with the interrupt point
     research_graph_compiled = builder.compile(
         checkpointer=memory, 
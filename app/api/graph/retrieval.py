@@ -0,0 +1,69 @@
+import re
+from typing import List, Sequence
+import numpy as np
+
+# In-process BM25 over a handful of passages (one interview's search results), scored with NumPy.
+# No network, no model download, no GPU: building and querying an index over a few hundred passages
+# takes well under a millisecond next to a multi-second LLM call.
+
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can did do does for from had has have how i if in into is it its "
+    "more most not of on or so such than that the their them then there these they this to was we were "
+    "what when where which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+class BM25Index:
+    """Okapi BM25 with the postings stored as flat NumPy arrays sorted by term id."""
+
+    def __init__(self, passages: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(passages)
+        self.vocabulary: dict = {}
+
+        doc_ids, term_ids = [], []
+        doc_lengths = np.zeros(self.num_docs, dtype=np.float32)
+        for doc_id, passage in enumerate(passages):
+            tokens = tokenize(passage)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                term_ids.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+
+        # Collapse (term, doc) pairs into term frequencies
+        pairs = np.asarray(term_ids, dtype=np.int64) * max(self.num_docs, 1) + np.asarray(doc_ids, dtype=np.int64)
+        unique_pairs, tfs = np.unique(pairs, return_counts=True) # Sorted, so postings end up grouped by term
+        self.post_terms = unique_pairs // max(self.num_docs, 1)
+        self.post_docs = unique_pairs % max(self.num_docs, 1)
+        self.post_tfs = tfs.astype(np.float32)
+        self.term_starts = np.searchsorted(self.post_terms, np.arange(len(self.vocabulary) + 1))
+
+        doc_freq = np.diff(self.term_starts).astype(np.float32)
+        self.idf = np.log1p((self.num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = float(doc_lengths.mean()) if self.num_docs and doc_lengths.mean() > 0 else 1.0
+        self.length_norm = k1 * (1.0 - b + b * doc_lengths / avg_length) # Per-document denominator term
+
+    def score(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        term_ids = sorted({self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary})
+        if not term_ids:
+            return scores
+        # Gather all postings of the query terms at once and accumulate per document
+        spans = [np.arange(self.term_starts[t], self.term_starts[t + 1]) for t in term_ids]
+        idx = np.concatenate(spans)
+        docs = self.post_docs[idx]
+        tfs = self.post_tfs[idx]
+        weights = self.idf[self.post_terms[idx]] * tfs * (self.k1 + 1.0) / (tfs + self.length_norm[docs])
+        np.add.at(scores, docs, weights)
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """Indices of the k best passages, best first (ties keep the original order)."""
+        scores = self.score(query)
+        order = np.argsort(-scores, kind="stable")
+        return [int(i) for i in order[:k]]
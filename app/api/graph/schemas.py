@@ -1,8 +1,9 @@
 from pydantic import BaseModel, Field
 from langgraph.graph import MessagesState
-from typing import List, TypedDict, Optional
+from typing import Dict, List, TypedDict, Optional
 from typing import Annotated # Changed from typing import Annotated for older python versions if any issue
 import operator # For Annotated with operator.add
+from app.api.core.config import max_analysts_limit
 
 
 class Analyst(BaseModel):
@@ -35,6 +36,23 @@ class InterviewState(MessagesState):
     analyst: Analyst
     interview: str
     sections: Annotated[list, operator.add] # Final key we duplicate in outer state for Send() API
+    report_fragments: Annotated[list, operator.add] # REPORT_MODE=progressive: this interview's passage of the report
+    topic: str # For the report passage
+    num_expert_answers: int # Incremented by generate_answer, so route_messages does not re-scan messages
+    answer_novelty: float # Share of new n-grams in the latest expert answer (see novelty.py)
+    context_seen: int # Number of context entries retrieved before the latest answer's turn
+    history_summary: str # Running summary of turns that left the conversation window (see history.py)
+    summarized_messages: int # How many messages after the opening one are folded into history_summary
+    dispatched_at: float # When the interview was sent out (Send), for the queue wait in traces
+    deadline_at: Optional[float] # Epoch seconds the run must be done by; route_messages wraps up before it
+    document_pool: str # Key of the thread's shared document pool (documents.py); context holds references into it
+
+
+class InterviewOutputState(TypedDict):
+    # What a finished interview hands back to ResearchGraphState. Per-interview keys that also exist in the
+    # parent (e.g. deadline_at) must not be returned, parallel interviews would write them concurrently.
+    sections: Annotated[list, operator.add]
+    report_fragments: Annotated[list, operator.add]
 
 
 class SearchQuery(BaseModel):
@@ -44,9 +62,16 @@ class SearchQuery(BaseModel):
 class ResearchGraphState(TypedDict):
     topic: str
     max_analysts: int
+    max_num_turns_interview: int # Optional input; interviews default to max_interview_turns
     human_analyst_feedback: Optional[str] # Made optional
+    deadline_at: Optional[float] # Set per run by AgentService (RESEARCH_DEADLINE_SECONDS), handed to every interview
+    document_pool: str # Set by AgentService (the thread id), handed to every interview
     analysts: List[Analyst]
+    prefetched_interviews: dict # Analyst name -> first interview turn prefetched during the feedback pause (speculation.py)
     sections: Annotated[list, operator.add]
+    report_fragments: Annotated[list, operator.add] # One per interview in REPORT_MODE=progressive, merged by write_report
+    formatted_sections: str # Built once by assemble_sections for write_report
+    sections_digest: str # What write_introduction / write_conclusion read; empty if the digest is disabled
     introduction: str
     content: str
     conclusion: str
@@ -55,10 +80,11 @@ class ResearchGraphState(TypedDict):
 # API Request/Response Models (New for FastAPI)
 class StartResearchRequest(BaseModel):
     topic: str
-    max_analysts: int
+    max_analysts: int = Field(ge=1, le=max_analysts_limit) # Every analyst is a parallel interview
 
 class FeedbackRequest(BaseModel):
     human_analyst_feedback: Optional[str]
+    deadline_seconds: Optional[float] = Field(None, ge=0) # Time budget of this run, overrides RESEARCH_DEADLINE_SECONDS (0 = none)
 
 class AnalystResponse(BaseModel):
     analysts: List[Analyst]
@@ -71,4 +97,22 @@ class ReportResponse(BaseModel):
 class StateResponse(BaseModel):
     state: dict
     next_action: Optional[List[str]] = None # To guide the frontend
-    thread_id: str
\ No newline at end of file
+    thread_id: str
+    checkpoint_id: Optional[str] = None # GET /state only; also sent as its ETag
+    totals: Optional[Dict[str, int]] = None # GET /state with offset/limit: full length of each paginated list
+class JobResponse(BaseModel):
+    job_id: str
+    thread_id: str
+    status: str # queued, running, completed, failed, cancelled
+    completed_nodes: List[str] = [] # Nodes of main_research_graph that have finished, in completion order
+    error: Optional[str] = None
+    result: Optional[StateResponse] = None # Filled in once the job has completed
+
+class CancelResponse(BaseModel):
+    thread_id: str
+    status: str # "cancelling"
+
+class TraceResponse(BaseModel):
+    thread_id: str
+    spans: List[dict] # One per node run, in completion order (see app/api/core/tracing.py for the fields)
+    summary: dict # Per-node totals, a grand total and the speculative (prefetch) part of it
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+from app.api.core.config import speculative_prefetch_enabled, speculative_prefetch_ttl_seconds
+from app.api.core.scheduler import current_lane, SPECULATIVE
+from app.api.core.tracing import node_span
+from .schemas import Analyst
+from .nodes import generate_question, create_search_query, web_search, search_wikipedia, opening_message
+
+# Speculative prefetch while the graph waits at the human_feedback_node interrupt.
+# The user usually needs a while to review the analysts. Meanwhile every analyst's first turn up to the
+# searches (question, search query, web + Wikipedia results) is run in the background, in the SPECULATIVE
+# scheduler lane, which also warms the search cache. If the user approves the analysts unchanged, the
+# interviews start from this prefetched turn at generate_answer; if the feedback regenerates the analysts,
+# the prefetch is cancelled and dropped. Prefetches live in the worker that served the request; on another
+# worker the interviews start normally (the shared search cache is still warm).
+
+
+class _Prefetch:
+    def __init__(self, analysts: List[Analyst], tasks: Dict[str, "asyncio.Task[dict]"]):
+        self.analysts_key = _analysts_key(analysts)
+        self.tasks = tasks # Analyst name -> task prefetching that analyst's first turn
+        self.started_at = time.monotonic()
+
+    def cancel(self) -> None:
+        for task in self.tasks.values():
+            task.cancel()
+
+_prefetches: Dict[str, _Prefetch] = {}
+
+def _analysts_key(analysts: List[Any]) -> tuple:
+    return tuple(tuple(sorted(Analyst.model_validate(a).model_dump().items())) for a in analysts)
+
+
+async def _run_speculative(name: str, node: Callable[[Any], Awaitable[dict]], state: Dict[str, Any], thread_id: str) -> dict:
+    # Traced like graph nodes, as "speculative:<name>", so the cost of speculation is visible in /trace and /metrics
+    async with node_span(name, state, {"configurable": {"thread_id": thread_id}}, speculative=True):
+        return await node(state)
+
+async def _prefetch_analyst(thread_id: str, topic: str, analyst: Analyst) -> dict:
+    current_lane.set(SPECULATIVE) # Only affects this task: real interviews and report calls go first
+    state: Dict[str, Any] = {"analyst": analyst, "messages": [opening_message(topic)], "context": [], "document_pool": thread_id}
+    question = await _run_speculative("ask_question", generate_question, state, thread_id)
+    state["messages"] = state["messages"] + question["messages"]
+    query = await _run_speculative("create_search_query", create_search_query, state, thread_id)
+    state["search_query"] = query["search_query"]
+    results = await asyncio.gather(
+        _run_speculative("web_search", web_search, state, thread_id),
+        _run_speculative("search_wikipedia", search_wikipedia, state, thread_id),
+    )
+    return {
+        "messages": state["messages"],
+        "search_query": state["search_query"],
+        "context": [doc for result in results for doc in result["context"]],
+    }
+
+def _drop_expired() -> None:
+    now = time.monotonic()
+    for thread_id, prefetch in list(_prefetches.items()):
+        if now - prefetch.started_at > speculative_prefetch_ttl_seconds:
+            discard_prefetch(thread_id)
+
+
+def start_prefetch(thread_id: str, topic: str, analysts: List[Any]) -> None:
+    """Starts prefetching the first interview turn of `analysts` (no-op unless SPECULATIVE_PREFETCH is on)."""
+    if not speculative_prefetch_enabled or not analysts:
+        return
+    _drop_expired()
+    discard_prefetch(thread_id)
+    analysts = [Analyst.model_validate(a) for a in analysts]
+    tasks = {a.name: asyncio.create_task(_prefetch_analyst(thread_id, topic, a)) for a in analysts}
+    for task in tasks.values(): # A failed prefetch is just not used; keep its exception from being logged as unretrieved
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    _prefetches[thread_id] = _Prefetch(analysts, tasks)
+
+def discard_prefetch(thread_id: str) -> None:
+    prefetch = _prefetches.pop(thread_id, None)
+    if prefetch is not None:
+        prefetch.cancel()
+
+def take_prefetch(thread_id: str, analysts: List[Any]) -> Dict[str, dict]:
+    """The finished prefetches for `analysts` (analyst name -> first-turn interview state).
+
+    Does not wait: prefetches still in flight are cancelled and those analysts start their interview normally,
+    so approving never waits behind the SPECULATIVE lane.
+    """
+    prefetch = _prefetches.pop(thread_id, None)
+    if prefetch is None:
+        return {}
+    prefetch.cancel() # No-op for the finished ones
+    if prefetch.analysts_key != _analysts_key(analysts): # The analysts changed since the prefetch started
+        return {}
+    return {
+        name: task.result() for name, task in prefetch.tasks.items()
+        if task.done() and not task.cancelled() and task.exception() is None
+    }
@@ -1,5 +1,7 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from app.api.routers import research
+from app.api.services.job_service import job_service_instance
+from app.api.core.tracing import render_metrics
 from app.api.core.config import OPENAI_API_KEY, TAVILY_API_KEY # To ensure they are loaded/checked
 
 app = FastAPI(title="AI Research Assistant API")
@@ -10,10 +12,20 @@ if not OPENAI_API_KEY or not TAVILY_API_KEY:
 
 app.include_router(research.router, prefix="/research", tags=["research"])
 
+@app.on_event("shutdown")
+async def shutdown_background_jobs():
+    await job_service_instance.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the AI Research Assistant API"}
 
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format; counters are per worker process
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # For development: allow all origins for CORS if Streamlit is on a different port
 from fastapi.middleware.cors import CORSMiddleware
 app.add_middleware(
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, HTTPException, Body
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Body, Header, Query, Response
+from sse_starlette.sse import EventSourceResponse
 from typing import Optional, List
-from app.api.services.agent_service import agent_service_instance
-from app.api.graph.schemas import StartResearchRequest, FeedbackRequest, Analyst, ReportResponse, StateResponse, AnalystResponse
+from app.api.services.agent_service import agent_service_instance, state_view
+from app.api.services.job_service import job_service_instance
+from app.api.core.locks import ThreadBusyError
+from app.api.core.admission import AdmissionRejectedError
+from app.api.core.cancellation import RunCancelledError, request_cancel
+from app.api.core.tracing import trace_store, summarize_spans
+from app.api.graph.schemas import StartResearchRequest, FeedbackRequest, Analyst, ReportResponse, StateResponse, AnalystResponse, JobResponse, TraceResponse, CancelResponse
 
 router = APIRouter()
 
@@ -15,13 +23,17 @@ async def start_new_research(request: StartResearchRequest):
             state={"analysts": result.get("analysts", [])}, # Simplified state for now
             next_action=result.get("next_action")
         )
+    except AdmissionRejectedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{thread_id}/feedback", response_model=StateResponse)
 async def submit_feedback(thread_id: str, request: FeedbackRequest):
     try:
-        result = await agent_service_instance.provide_feedback_or_continue(thread_id, request.human_analyst_feedback)
+        result = await agent_service_instance.provide_feedback_or_continue(
+            thread_id, request.human_analyst_feedback, deadline_seconds=request.deadline_seconds
+        )
         
         response_data = {
             "thread_id": result["thread_id"],
@@ -37,22 +49,152 @@ async def submit_feedback(thread_id: str, request: FeedbackRequest):
             # Potentially use a different response model for completed state
 
         return StateResponse(**response_data)
+    except ThreadBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except RunCancelledError as e: # Stopped by /cancel or its deadline; the thread can be resumed later
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _job_to_response(job: dict) -> JobResponse:
+    result = job.get("result")
+    return JobResponse(
+        job_id=job["job_id"],
+        thread_id=job["thread_id"],
+        status=job["status"],
+        completed_nodes=list(job["completed_nodes"]),
+        error=job.get("error"),
+        result=StateResponse(
+            thread_id=result["thread_id"],
+            state={
+                "analysts": result.get("analysts", []),
+                "final_report": result.get("final_report")
+            },
+            next_action=result.get("next_action")
+        ) if result else None
+    )
+
+@router.post("/{thread_id}/feedback/job", response_model=JobResponse, status_code=202)
+async def submit_feedback_job(thread_id: str, request: FeedbackRequest):
+    # Same as /feedback, but the graph runs in the background job queue and a job handle is returned right away
+    try:
+        job = await job_service_instance.submit_feedback_job(thread_id, request.human_analyst_feedback, deadline_seconds=request.deadline_seconds)
+    except ThreadBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _job_to_response(job)
+
+# Nodes whose output is pushed to the client as soon as they finish, and the state key that holds it
+STREAMED_NODE_OUTPUTS = {
+    "write_section": "sections",
+    "write_introduction": "introduction",
+    "write_report": "content",
+    "write_conclusion": "conclusion",
+    "finalize_report": "final_report",
+}
+
+@router.post("/{thread_id}/feedback/stream")
+async def stream_feedback(thread_id: str, request: FeedbackRequest):
+    # Server-Sent Events version of /feedback. Emits:
+    #   node     -> {"node", "namespace"} every time a node (main graph or interview subgraph) finishes
+    #   section  -> {"index", "section"} for each analyst memo as its interview finishes
+    #   introduction / content / conclusion / final_report -> {"text"} for the report parts
+    #   done     -> the same payload /feedback returns, once the run stops
+    #   cancelled -> {"detail"} if the run was stopped by /cancel or its deadline
+    #   error    -> {"detail"} if the run fails
+    async def event_generator():
+        sections_sent = 0
+        try:
+            async for namespace, node_name, update in agent_service_instance.stream_feedback_or_continue(
+                thread_id, request.human_analyst_feedback, subgraphs=True, deadline_seconds=request.deadline_seconds
+            ):
+                yield {"event": "node", "data": json.dumps({"node": node_name, "namespace": list(namespace)})}
+                state_key = STREAMED_NODE_OUTPUTS.get(node_name)
+                if not state_key or state_key not in update:
+                    continue
+                if state_key == "sections":
+                    for section in update["sections"]:
+                        yield {"event": "section", "data": json.dumps({"index": sections_sent, "section": section})}
+                        sections_sent += 1
+                else:
+                    yield {"event": state_key, "data": json.dumps({"text": update[state_key]})}
+
+            result = await agent_service_instance._feedback_response(thread_id)
+            payload = StateResponse(
+                thread_id=result["thread_id"],
+                state={
+                    "analysts": result.get("analysts", []),
+                    "final_report": result.get("final_report")
+                },
+                next_action=result.get("next_action")
+            )
+            yield {"event": "done", "data": payload.model_dump_json()}
+        except RunCancelledError as e:
+            yield {"event": "cancelled", "data": json.dumps({"detail": str(e)})}
+        except Exception as e:
+            yield {"event": "error", "data": json.dumps({"detail": str(e)})}
+
+    return EventSourceResponse(event_generator())
+
+@router.post("/{thread_id}/cancel", response_model=CancelResponse, status_code=202)
+async def cancel_run(thread_id: str):
+    # Stops the thread's run (or its queued job) in whichever worker has it; in-flight LLM and search calls are cancelled
+    if not request_cancel(thread_id) and not await job_service_instance.cancel_queued_job(thread_id):
+        raise HTTPException(status_code=404, detail="No run in progress for this thread.")
+    return CancelResponse(thread_id=thread_id, status="cancelling")
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_status(job_id: str):
+    job = await job_service_instance.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job ID not found.")
+    return _job_to_response(job)
+
+@router.get("/{thread_id}/trace", response_model=TraceResponse)
+async def get_thread_trace(thread_id: str):
+    # Per-node latency, queue wait, tokens, cost and cache hits of every run on this thread
+    spans = await asyncio.to_thread(trace_store.for_thread, thread_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="No trace recorded for this thread.")
+    return TraceResponse(thread_id=thread_id, spans=spans, summary=summarize_spans(spans))
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
 @router.get("/{thread_id}/state", response_model=StateResponse)
-async def get_thread_state(thread_id: str):
+async def get_thread_state(
+    thread_id: str,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma-separated state keys to return (default: all)"),
+    summary: bool = Query(False, description="Sizes and item counts per key instead of the values"),
+    offset: int = Query(0, ge=0, description="First item of every list value returned"),
+    limit: Optional[int] = Query(None, ge=0, description="Max items of every list value returned"),
+    if_none_match: Optional[str] = Header(None),
+):
+    # The ETag is the checkpoint id: pollers get 304 Not Modified until the thread's state changes
     try:
-        state_info = agent_service_instance.get_current_state_info(thread_id)
+        state_info = await agent_service_instance.get_current_state_info(thread_id)
         if "error" in state_info:
             raise HTTPException(status_code=404, detail=state_info["error"])
-        
-        # Adapt state_info to StateResponse
-        # state_info['values'] is the full graph state. We might want to be selective.
+
+        etag = f'"{state_info["checkpoint_id"]}"'
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        view = state_view(
+            state_info, [f.strip() for f in fields.split(",") if f.strip()] if fields is not None else None,
+            summary=summary, offset=offset, limit=limit,
+        )
         return StateResponse(
             thread_id=state_info["thread_id"],
-            state=state_info.get("values", {}), 
-            next_action=state_info.get("next_action")
+            state=view["state"],
+            next_action=state_info.get("next_action"),
+            checkpoint_id=state_info["checkpoint_id"],
+            totals=view["totals"],
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
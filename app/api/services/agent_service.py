@@ -1,16 +1,75 @@
+import time
 import uuid
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
+from langgraph.types import StateSnapshot
 from app.api.graph.research_graph import main_research_graph
 from app.api.graph.schemas import Analyst # For typing
+from app.api.graph.speculation import start_prefetch, take_prefetch, discard_prefetch
+from app.api.core.locks import thread_lock
+from app.api.core.admission import interview_admission
+from app.api.core.cancellation import run_cancellable, stream_cancellable
+from app.api.core.config import research_deadline_seconds, state_snapshot_cache_size
 
 class AgentService:
-    def __init__(self):
+    def __init__(self, snapshot_cache_size: int = state_snapshot_cache_size):
         self.graph = main_research_graph
+        # Latest StateSnapshot per thread (read-through). Dropped whenever this service writes the thread, bypassed
+        # while it runs here, and checked against the newest checkpoint id when another worker may have written it.
+        self.snapshot_cache_size = snapshot_cache_size
+        self._snapshots: "OrderedDict[str, StateSnapshot]" = OrderedDict()
+        self._running: set = set()
 
     def _get_thread_config(self, thread_id: str) -> Dict[str, Dict[str, str]]:
         return {"configurable": {"thread_id": thread_id}}
 
+    @staticmethod
+    def _deadline_at(deadline_seconds: Optional[float]) -> Optional[float]:
+        budget = research_deadline_seconds if deadline_seconds is None else deadline_seconds
+        return time.time() + budget if budget > 0 else None
+
+    def _invalidate(self, thread_id: str) -> None:
+        self._snapshots.pop(thread_id, None)
+
+    async def _get_snapshot(self, thread_id: str) -> StateSnapshot:
+        cached = self._snapshots.get(thread_id)
+        if cached is not None:
+            latest_checkpoint_id = getattr(self.graph.checkpointer, "alatest_checkpoint_id", None)
+            # Without a shared checkpointer (memory backend, single worker) every write goes through this service
+            if latest_checkpoint_id is None or await latest_checkpoint_id(thread_id) == cached.config["configurable"].get("checkpoint_id"):
+                self._snapshots.move_to_end(thread_id)
+                return cached
+            self._invalidate(thread_id)
+        snapshot = await self.graph.aget_state(self._get_thread_config(thread_id))
+        if self.snapshot_cache_size > 0 and thread_id not in self._running and snapshot.config["configurable"].get("checkpoint_id"):
+            self._snapshots[thread_id] = snapshot
+            while len(self._snapshots) > self.snapshot_cache_size:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    async def _update_state(self, thread_id: str, values: Dict[str, Any]) -> None:
+        self._invalidate(thread_id)
+        await self.graph.aupdate_state(self._get_thread_config(thread_id), values)
+
+    async def _resume_update(self, thread_id: str, human_feedback: Optional[str], deadline_at: Optional[float]) -> Dict[str, Any]:
+        # State update that resumes the thread after the analyst review
+        update = {"human_analyst_feedback": human_feedback, "deadline_at": deadline_at, "document_pool": thread_id}
+        if human_feedback: # The analysts will be regenerated, so whatever was prefetched for them is useless
+            discard_prefetch(thread_id)
+            update["prefetched_interviews"] = {}
+        else:
+            analysts = (await self._get_snapshot(thread_id)).values.get("analysts", [])
+            update["prefetched_interviews"] = take_prefetch(thread_id, analysts)
+        return update
+
+    async def _prefetch_if_waiting(self, thread_id: str) -> None:
+        # Waiting for analyst review again: prefetch the first interview turns meanwhile (SPECULATIVE_PREFETCH)
+        state = await self._get_snapshot(thread_id)
+        if state and state.next and "human_feedback_node" in state.next:
+            start_prefetch(thread_id, state.values.get("topic", ""), state.values.get("analysts", []))
+
     async def start_research(self, topic: str, max_analysts: int) -> Dict[str, Any]:
+        interview_admission.check_admission() # Raises AdmissionRejectedError when the interview backlog is full
         thread_id = str(uuid.uuid4())
         config = self._get_thread_config(thread_id)
 
@@ -18,6 +77,7 @@ class AgentService:
             "topic": topic,
             "max_analysts": max_analysts,
             "human_analyst_feedback": None,
+            "document_pool": thread_id,
             "analysts": [],
             "sections": [],
             "introduction": "",
@@ -28,10 +88,14 @@ class AgentService:
 
         # Use ainvoke to run until the first interrupt or completion
         # ainvoke will return the final state of the graph run (or state at interrupt)
-        await self.graph.ainvoke(initial_input, config)
-        # After ainvoke, the checkpointer (MemorySaver) is updated.
+        self._running.add(thread_id)
+        try:
+            await self.graph.ainvoke(initial_input, config)
+        finally:
+            self._running.discard(thread_id)
+        # After ainvoke, the checkpointer is updated.
 
-        current_state = self.graph.get_state(config)
+        current_state = await self._get_snapshot(thread_id)
         if not current_state:
             raise Exception(f"Failed to get state for thread_id: {thread_id} after initial invoke.")
 
@@ -41,21 +105,57 @@ class AgentService:
             "next_action": list(current_state.next) if current_state.next else None,
             "is_complete": not current_state.next
         }
+        await self._prefetch_if_waiting(thread_id)
         return response
 
-    async def provide_feedback_or_continue(self, thread_id: str, human_feedback: Optional[str]) -> Dict[str, Any]:
+    async def provide_feedback_or_continue(self, thread_id: str, human_feedback: Optional[str], deadline_seconds: Optional[float] = None) -> Dict[str, Any]:
         config = self._get_thread_config(thread_id)
 
-        self.graph.update_state(
-            config,
-            {"human_analyst_feedback": human_feedback}
-        )
+        # Only one run per thread at a time, across all worker processes (raises ThreadBusyError)
+        async with thread_lock(thread_id):
+            deadline_at = self._deadline_at(deadline_seconds)
+            await self._update_state(thread_id, await self._resume_update(thread_id, human_feedback, deadline_at))
+
+            # Continue execution using ainvoke from the updated state
+            # Pass None as input to continue from the current state.
+            # Runs as a cancellable task: /cancel or the deadline raise RunCancelledError here
+            self._running.add(thread_id)
+            try:
+                await run_cancellable(thread_id, self.graph.ainvoke(None, config), deadline_at)
+            finally:
+                self._running.discard(thread_id)
+            await self._prefetch_if_waiting(thread_id)
 
-        # Continue execution using ainvoke from the updated state
-        # Pass None as input to continue from the current state
-        await self.graph.ainvoke(None, config)
+        return await self._feedback_response(thread_id)
 
-        current_state = self.graph.get_state(config)
+    async def stream_feedback_or_continue(self, thread_id: str, human_feedback: Optional[str], subgraphs: bool = False,
+                                         deadline_seconds: Optional[float] = None) -> AsyncIterator[Tuple[Tuple[str, ...], str, Dict[str, Any]]]:
+        """Same as provide_feedback_or_continue, but yields (namespace, node_name, state_update) as each node finishes.
+
+        namespace is () for nodes of the main graph. With subgraphs=True, nodes inside each conduct_interview
+        run are yielded too, with a namespace like ("conduct_interview:<task_id>",).
+        """
+        config = self._get_thread_config(thread_id)
+
+        async with thread_lock(thread_id):
+            deadline_at = self._deadline_at(deadline_seconds)
+            await self._update_state(thread_id, await self._resume_update(thread_id, human_feedback, deadline_at))
+
+            stream = self.graph.astream(None, config, stream_mode="updates", subgraphs=subgraphs)
+            self._running.add(thread_id)
+            try:
+                async for item in stream_cancellable(thread_id, stream, deadline_at):
+                    namespace, chunk = item if subgraphs else ((), item)
+                    for node_name, update in chunk.items():
+                        if node_name.startswith("__"): # e.g. __interrupt__ markers
+                            continue
+                        yield tuple(namespace), node_name, update or {}
+            finally:
+                self._running.discard(thread_id)
+            await self._prefetch_if_waiting(thread_id)
+
+    async def _feedback_response(self, thread_id: str) -> Dict[str, Any]:
+        current_state = await self._get_snapshot(thread_id)
         if not current_state:
             raise Exception(f"Failed to get state for thread_id: {thread_id} after feedback invoke.")
 
@@ -68,19 +168,68 @@ class AgentService:
         }
         return response
 
-    def get_current_state_info(self, thread_id: str) -> Dict[str, Any]:
-        config = self._get_thread_config(thread_id)
+    async def get_current_state_info(self, thread_id: str) -> Dict[str, Any]:
         try:
-            state = self.graph.get_state(config)
-            if not state:
+            state = await self._get_snapshot(thread_id)
+            if not state or not state.config["configurable"].get("checkpoint_id"): # Nothing checkpointed for this thread
                 return {"error": "Thread ID not found or no state available.", "thread_id": thread_id}
+            writes = (state.metadata or {}).get("writes")
             return {
                 "thread_id": thread_id,
                 "values": dict(state.values),
                 "next_action": list(state.next) if state.next else None,
-                "is_complete": not state.next
+                "is_complete": not state.next,
+                "checkpoint_id": state.config["configurable"]["checkpoint_id"], # Changes on every state write
+                "step": (state.metadata or {}).get("step"),
+                "last_nodes": list(writes) if isinstance(writes, dict) else [],
             }
         except Exception as e:
             return {"error": str(e), "thread_id": thread_id, "message": "State for thread_id may not exist."}
 
+
+def _approx_size(value: Any) -> int:
+    # Characters of text a state value holds, without JSON-encoding it
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + _approx_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(_approx_size(item) for item in value)
+    if hasattr(value, "__dict__"): # Pydantic models, messages
+        return _approx_size(vars(value))
+    return len(str(value))
+
+def state_view(state_info: Dict[str, Any], fields: Optional[List[str]] = None, summary: bool = False,
+               offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Lightweight views of get_current_state_info()["values"]. Returns {"state", "totals"}.
+
+    fields:  only these state keys.
+    summary: per key its size (and item count for lists), plus the step and the nodes that wrote last,
+             instead of the values.
+    offset / limit: page through list values; "totals" then holds each list's full length.
+    """
+    values = state_info["values"]
+    if fields is not None:
+        values = {key: values[key] for key in fields if key in values}
+    if summary:
+        return {
+            "state": {
+                "step": state_info.get("step"),
+                "last_nodes": state_info.get("last_nodes", []),
+                "fields": {
+                    key: {"size": _approx_size(value), **({"count": len(value)} if isinstance(value, (list, dict)) else {})}
+                    for key, value in values.items()
+                },
+            },
+            "totals": None,
+        }
+    if offset or limit is not None:
+        end = None if limit is None else offset + limit
+        totals = {key: len(value) for key, value in values.items() if isinstance(value, list)}
+        values = {key: value[offset:end] if isinstance(value, list) else value for key, value in values.items()}
+        return {"state": values, "totals": totals}
+    return {"state": values, "totals": None}
+
 agent_service_instance = AgentService()
\ No newline at end of file
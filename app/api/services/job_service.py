@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Set
+from app.api.core.config import max_concurrent_jobs, max_finished_jobs, checkpointer_backend, checkpoint_db_path
+from app.api.core.locks import ThreadBusyError, is_thread_locked
+from app.api.core.cancellation import RunCancelledError
+from app.api.services.agent_service import AgentService, agent_service_instance
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class MemoryJobStore:
+    """Job records of this process only. Enough for a single worker."""
+
+    def __init__(self):
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def save(self, job: Dict[str, Any]) -> None:
+        self.jobs[job["job_id"]] = job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def active_job_for_thread(self, thread_id: str) -> Optional[str]:
+        for job in self.jobs.values():
+            if job["thread_id"] == thread_id and job["status"] in ACTIVE_STATES:
+                return job["job_id"]
+        return None
+
+    def evict_finished(self, keep: int) -> None:
+        # Oldest finished jobs go first once we keep more than `keep` of them
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] not in ACTIVE_STATES]
+        for job_id in finished[:max(0, len(finished) - keep)]:
+            del self.jobs[job_id]
+
+    # Same async API as SqliteJobStore; a dict needs no worker thread
+    async def asave(self, job: Dict[str, Any]) -> None:
+        self.save(job)
+
+    async def aget(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.get(job_id)
+
+    async def aactive_job_for_thread(self, thread_id: str) -> Optional[str]:
+        return self.active_job_for_thread(thread_id)
+
+    async def aevict_finished(self, keep: int) -> None:
+        self.evict_finished(keep)
+
+
+class SqliteJobStore:
+    """Job records in the shared SQLite file, so any worker can answer a status poll."""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    thread_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_thread_status ON jobs (thread_id, status);
+                """
+            )
+
+    def save(self, job: Dict[str, Any]) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, thread_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                (job["job_id"], job["thread_id"], job["status"], job["created_at"], json.dumps(job, default=_json_default)),
+            )
+            self.conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def active_job_for_thread(self, thread_id: str) -> Optional[str]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM jobs WHERE thread_id = ? AND status IN (?, ?)",
+                (thread_id, *ACTIVE_STATES),
+            ).fetchall()
+        for (data,) in rows:
+            job = json.loads(data)
+            if _job_alive(job):
+                return job["job_id"]
+            # Left behind by a worker that crashed or was killed: it would block the thread forever
+            job.update(status=FAILED, error="The worker running this job stopped.", finished_at=time.time())
+            self.save(job)
+        return None
+
+    def evict_finished(self, keep: int) -> None:
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN (?, ?) AND job_id NOT IN "
+                "(SELECT job_id FROM jobs WHERE status NOT IN (?, ?) ORDER BY created_at DESC LIMIT ?)",
+                (*ACTIVE_STATES, *ACTIVE_STATES, keep),
+            )
+            self.conn.commit()
+
+    # Async API for JobService: the file is shared with the checkpointer and other workers, so a write can
+    # wait on the busy timeout. That wait happens in a worker thread instead of on the event loop.
+    async def asave(self, job: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self.save, job)
+
+    async def aget(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, job_id)
+
+    async def aactive_job_for_thread(self, thread_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.active_job_for_thread, thread_id)
+
+    async def aevict_finished(self, keep: int) -> None:
+        await asyncio.to_thread(self.evict_finished, keep)
+
+def _job_alive(job: Dict[str, Any]) -> bool:
+    # A running job holds the thread's file lock, which the OS releases if its worker dies.
+    # A queued job is alive as long as the worker that accepted it is (workers share the host, like the locks).
+    if job["status"] == RUNNING:
+        return is_thread_locked(job["thread_id"])
+    pid = job.get("worker_pid")
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError: # Exists, owned by another user
+        return True
+    return True
+
+def _json_default(value: Any) -> Any:
+    # Results carry Analyst models
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JobService:
+    """Runs the post-feedback part of the research graph as background tasks.
+
+    At most `max_concurrent_jobs` graph runs execute at once in this worker, the rest wait in FIFO order on the semaphore.
+    """
+
+    def __init__(self, agent_service: AgentService, store=None, max_concurrency: int = max_concurrent_jobs, max_finished: int = max_finished_jobs):
+        self.agent_service = agent_service
+        self.store = store if store is not None else MemoryJobStore()
+        self.max_finished = max_finished
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None # Created lazily, inside the running event loop
+        self._tasks: Dict[str, asyncio.Task] = {} # thread_id -> task of its active job (also keeps tasks from being garbage collected)
+        self._submitting: Set[str] = set() # Threads whose job is being checked and saved, so two requests cannot both pass the check
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    async def submit_feedback_job(self, thread_id: str, human_feedback: Optional[str], deadline_seconds: Optional[float] = None) -> Dict[str, Any]:
+        if thread_id in self._submitting:
+            raise ThreadBusyError(f"Thread {thread_id} already has a job being submitted")
+        self._submitting.add(thread_id)
+        try:
+            job = await self._create_job(thread_id)
+        finally:
+            self._submitting.discard(thread_id)
+
+        task = asyncio.create_task(self._run(job, human_feedback, deadline_seconds))
+        self._tasks[thread_id] = task
+        task.add_done_callback(lambda done: self._tasks.pop(thread_id) if self._tasks.get(thread_id) is done else None)
+        return job
+
+    async def _create_job(self, thread_id: str) -> Dict[str, Any]:
+        active_job_id = await self.store.aactive_job_for_thread(thread_id)
+        if active_job_id:
+            raise ThreadBusyError(f"Thread {thread_id} already has an active job: {active_job_id}")
+
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "thread_id": thread_id,
+            "status": QUEUED,
+            "completed_nodes": [],
+            "error": None,
+            "result": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "worker_pid": os.getpid(),
+        }
+        await self.store.asave(job)
+        return job
+
+    async def _run(self, job: Dict[str, Any], human_feedback: Optional[str], deadline_seconds: Optional[float] = None) -> None:
+        thread_id = job["thread_id"]
+        try:
+            async with self._get_semaphore():
+                job["status"] = RUNNING
+                job["started_at"] = time.time()
+                await self.store.asave(job)
+                async for _, node_name, _ in self.agent_service.stream_feedback_or_continue(thread_id, human_feedback, deadline_seconds=deadline_seconds):
+                    job["completed_nodes"].append(node_name)
+                    await self.store.asave(job)
+                job["result"] = await self.agent_service._feedback_response(thread_id)
+                job["status"] = COMPLETED
+        except asyncio.CancelledError:
+            job["status"] = CANCELLED
+            job["error"] = "Job was cancelled."
+            raise
+        except RunCancelledError as e: # /cancel or the deadline stopped the graph run
+            job["status"] = CANCELLED
+            job["error"] = str(e)
+        except Exception as e:
+            job["status"] = FAILED
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = time.time()
+            await self.store.asave(job)
+            await self.store.aevict_finished(self.max_finished)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.aget(job_id)
+
+    async def cancel_queued_job(self, thread_id: str) -> bool:
+        """Cancels this worker's job for `thread_id` if it is still waiting for a slot. Running jobs are
+        stopped through the cancellation registry instead."""
+        task = self._tasks.get(thread_id)
+        if task is None:
+            return False
+        job_id = await self.store.aactive_job_for_thread(thread_id)
+        job = await self.store.aget(job_id) if job_id else None
+        if job is None or job["status"] != QUEUED or self._tasks.get(thread_id) is not task:
+            return False
+        task.cancel()
+        return True
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# With the SQLite checkpointer, job records live next to the checkpoints so every worker sees them
+job_service_instance = JobService(
+    agent_service_instance,
+    store=SqliteJobStore(checkpoint_db_path) if checkpointer_backend == "sqlite" else MemoryJobStore()
+)
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests # To call FastAPI
+import json
 import time # For simulated progress
 
 FASTAPI_URL = "http://api:8000/research" # Ensure this is correct for Docker Compose
@@ -23,6 +24,22 @@ if "processing" not in st.session_state: # for loading indicators
     st.session_state.processing = False
 
 
+def iter_sse_events(response):
+    """Yields (event, data) pairs from a streaming Server-Sent Events response; data is decoded from JSON."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "": # A blank line terminates the event
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].lstrip())
+        # Lines starting with ':' are keep-alive comments (pings) and are ignored
+
 def display_analysts(analysts_list):
     if analysts_list:
         st.subheader("Generated Analysts:")
@@ -56,16 +73,20 @@ if st.session_state.current_step == "initial_input":
         with st.spinner("Initializing research and generating analysts... This may take a moment."):
             try:
                 response = requests.post(f"{FASTAPI_URL}/start", json={"topic": topic, "max_analysts": max_analysts})
-                response.raise_for_status()
-                data = response.json()
-                st.session_state.thread_id = data.get("thread_id")
-                state_data = data.get("state", {})
-                st.session_state.analysts = state_data.get("analysts", [])
-
-                if st.session_state.analysts:
-                    st.session_state.current_step = "show_analysts"
+                if response.status_code == 503: # Admission control: too much research already in progress
+                    retry_after = response.headers.get("Retry-After", "a few")
+                    st.session_state.error_message = f"The server is busy right now. Please try again in {retry_after} seconds."
                 else:
-                    st.session_state.error_message = "No analysts were generated. Please check the topic or backend logs."
+                    response.raise_for_status()
+                    data = response.json()
+                    st.session_state.thread_id = data.get("thread_id")
+                    state_data = data.get("state", {})
+                    st.session_state.analysts = state_data.get("analysts", [])
+
+                    if st.session_state.analysts:
+                        st.session_state.current_step = "show_analysts"
+                    else:
+                        st.session_state.error_message = "No analysts were generated. Please check the topic or backend logs."
                 
             except requests.exceptions.RequestException as e:
                 st.session_state.error_message = f"API Error: {e}. Is the backend running at {FASTAPI_URL}?"
@@ -83,6 +104,7 @@ elif st.session_state.current_step == "show_analysts" and st.session_state.threa
                             placeholder="e.g., Focus more on financial implications.")
 
     col1, col2 = st.columns(2)
+    stream_area = st.container() # Full-width area below the buttons for live report progress
     with col1:
         if st.button("🔄 Regenerate Analysts with Feedback", disabled=st.session_state.processing or not feedback.strip()): # Check if feedback is not just whitespace
             st.session_state.processing = True
@@ -119,12 +141,32 @@ elif st.session_state.current_step == "show_analysts" and st.session_state.threa
             st.session_state.error_message = None
             with st.spinner("Analysts confirmed. Generating the full research report... This will take several minutes."):
                 try:
-                    response = requests.post(
-                        f"{FASTAPI_URL}/{st.session_state.thread_id}/feedback",
-                        json={"human_analyst_feedback": None} 
-                    )
-                    response.raise_for_status()
-                    data = response.json()
+                    # Stream graph progress over SSE and render each part of the report as soon as it is written
+                    data = {}
+                    with stream_area:
+                        progress_placeholder = st.empty()
+                        sections_container = st.container()
+                        report_placeholders = {key: st.empty() for key in ("introduction", "content", "conclusion")}
+                    with requests.post(
+                        f"{FASTAPI_URL}/{st.session_state.thread_id}/feedback/stream",
+                        json={"human_analyst_feedback": None},
+                        stream=True
+                    ) as response:
+                        response.raise_for_status()
+                        for event, payload in iter_sse_events(response):
+                            if event == "node":
+                                progress_placeholder.caption(f"Finished step: {payload.get('node')}")
+                            elif event == "section":
+                                with sections_container.expander(f"Analyst memo {payload.get('index', 0) + 1}", expanded=False):
+                                    st.markdown(payload.get("section", ""))
+                            elif event in report_placeholders:
+                                report_placeholders[event].markdown(payload.get("text", ""))
+                            elif event == "done":
+                                data = payload
+                            elif event == "cancelled": # Stopped by /cancel or the run deadline
+                                raise Exception(payload.get("detail") or "Report generation was cancelled.")
+                            elif event == "error":
+                                raise Exception(payload.get("detail") or "Report generation failed.")
                     state_data = data.get("state", {})
                     st.session_state.final_report = state_data.get("final_report")
                     if st.session_state.final_report:
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+from langchain_core._api import suppress_langchain_beta_warning
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.load import dumps, loads
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Record/replay of LLM, Tavily and Wikipedia traffic.
+# `record` mode wraps the real clients and writes every response to a JSON cassette; `replay` mode serves
+# the same responses from disk (no keys, no network) and fails loudly on anything that was not recorded.
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = REPLAY):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.entries: Dict[str, Dict[str, Any]] = {"llm": {}, "tavily": {}, "wikipedia": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries.update(json.load(f))
+        elif mode == REPLAY:
+            raise FileNotFoundError(f"Cassette {path} does not exist; record it first with --cassette-mode record")
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, kind: str, key: str) -> Any:
+        if key not in self.entries[kind]:
+            raise KeyError(f"No recorded {kind} response for this request in {self.path}; re-record the cassette.")
+        return self.entries[kind][key]
+
+    def put(self, kind: str, key: str, value: Any) -> None:
+        self.entries[kind][key] = value
+
+    def save(self) -> None:
+        if self.mode != RECORD:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+
+
+def _request_messages(messages: List[BaseMessage]) -> List[tuple]:
+    # Not dumps(messages): add_messages gives every state message a random id, which would change the key per run
+    return [(m.type, m.name, m.content, getattr(m, "tool_calls", None)) for m in messages]
+
+
+class CassetteChatModel(BaseChatModel):
+    """Records (around `inner`) or replays chat completions, keyed by the messages and bound tools."""
+
+    cassette: Any
+    inner: Optional[BaseChatModel] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError("CassetteChatModel is async-only, like the research graph.")
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tools = kwargs.get("tools")
+        key = Cassette.key(_request_messages(messages), tools, kwargs.get("tool_choice"))
+        if self.cassette.mode == REPLAY:
+            with suppress_langchain_beta_warning():
+                message = loads(self.cassette.get("llm", key))
+        else:
+            runnable = self.inner
+            if tools:
+                runnable = self.inner.bind_tools(tools, tool_choice=kwargs.get("tool_choice"))
+            message = await runnable.ainvoke(messages, stop=stop)
+            self.cassette.put("llm", key, dumps(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class CassetteSearch:
+    """Records (around `inner`) or replays TavilySearchResults.ainvoke."""
+
+    def __init__(self, cassette: Cassette, inner: Any = None):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def ainvoke(self, query: str) -> Any:
+        key = Cassette.key(query)
+        if self.cassette.mode == REPLAY:
+            return self.cassette.get("tavily", key)
+        results = await self.inner.ainvoke(query)
+        self.cassette.put("tavily", key, results)
+        return results
+
+
+class CassetteWikipedia:
+    """Records (around `inner`, e.g. aload_wikipedia) or replays Wikipedia page fetches."""
+
+    def __init__(self, cassette: Cassette, inner: Any = None):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def __call__(self, query: str, load_max_docs: int = 3, **kwargs: Any) -> List[Document]:
+        key = Cassette.key(query, load_max_docs)
+        if self.cassette.mode == REPLAY:
+            return [Document(**doc) for doc in self.cassette.get("wikipedia", key)]
+        docs = await self.inner(query, load_max_docs=load_max_docs, **kwargs)
+        self.cassette.put("wikipedia", key, [{"page_content": d.page_content, "metadata": d.metadata} for d in docs])
+        return docs
@@ -0,0 +1,143 @@
+import asyncio
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Local stand-ins for the OpenAI chat model, the Tavily tool and the Wikipedia fetch.
+# They answer with deterministic filler text after a configurable delay, so the research graph can be
+# timed without API keys or network access. The chat model goes through LangChain's normal code paths
+# (callbacks, LLM cache, bind_tools + with_structured_output), like ChatOpenAI does.
+
+_WORDS = ("analysis market model data risk policy adoption evidence trend system research impact "
+          "study cost performance safety regulation benchmark deployment scale").split()
+
+def filler_text(num_tokens: int, seed: int = 0) -> str:
+    """About num_tokens tokens of text (one short word ~ one token)."""
+    return " ".join(_WORDS[(seed + i * 7) % len(_WORDS)] for i in range(max(1, num_tokens)))
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that sleeps `latency_seconds + completion_tokens * seconds_per_token` and returns filler text.
+
+    Structured output requests (bound tools) get a tool call with synthesized arguments for the schemas
+    this app uses (Perspectives, SearchQuery).
+    """
+
+    latency_seconds: float = 0.2
+    seconds_per_token: float = 0.0
+    completion_tokens: int = 300
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[list]) -> AIMessage:
+        self.calls += 1
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        if tools:
+            tool = tools[0]["function"]
+            args = self._tool_arguments(tool["name"], messages)
+            message = AIMessage(content="", tool_calls=[{"name": tool["name"], "args": args, "id": f"call_{self.calls}"}])
+            completion_tokens = len(str(args).split())
+        else:
+            last = str(messages[-1].content) if messages else ""
+            if "introduction" in last.lower():
+                content = f"# Benchmark Report\n\n## Introduction\n{filler_text(self.completion_tokens // 3, self.calls)}"
+            elif "conclusion" in last.lower():
+                content = f"## Conclusion\n{filler_text(self.completion_tokens // 3, self.calls)}"
+            elif "memos" in last.lower():
+                content = f"## Insights\n{filler_text(self.completion_tokens, self.calls)} [1]\n\n## Sources\n[1] https://example.com/{self.calls}"
+            else:
+                content = (f"## Section {self.calls}\n### Summary\n{filler_text(self.completion_tokens, self.calls)} [1]\n"
+                           f"### Sources\n[1] https://example.com/{self.calls}")
+            message = AIMessage(content=content)
+            completion_tokens = len(content.split())
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        message.response_metadata = {"model_name": "fake-chat-model"}
+        return message
+
+    def _tool_arguments(self, tool_name: str, messages: List[BaseMessage]) -> Dict[str, Any]:
+        if tool_name == "Perspectives":
+            match = re.search(r"Pick the top (\d+) themes", str(messages[0].content))
+            count = int(match.group(1)) if match else 3
+            return {"analysts": [
+                {
+                    "affiliation": f"Institute {i}",
+                    "name": f"Analyst {i}",
+                    "role": f"Researcher focused on theme {i}",
+                    "description": f"Studies {filler_text(12, i)}",
+                    "question_style": "Direct and specific",
+                } for i in range(count)
+            ]}
+        if tool_name == "SearchQuery":
+            return {"search_query": " ".join(str(messages[-1].content).split()[:8]) or "benchmark query"}
+        return {}
+
+    def _delay(self, completion_tokens: int) -> float:
+        return self.latency_seconds + completion_tokens * self.seconds_per_token
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._respond(messages, kwargs.get("tools"))
+        time.sleep(self._delay(message.usage_metadata["output_tokens"]))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._respond(messages, kwargs.get("tools"))
+        await asyncio.sleep(self._delay(message.usage_metadata["output_tokens"]))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeTavilySearch:
+    """Stands in for TavilySearchResults: `ainvoke(query)` returns `max_results` result dicts."""
+
+    def __init__(self, latency_seconds: float = 0.5, max_results: int = 3, content_tokens: int = 200):
+        self.latency_seconds = latency_seconds
+        self.max_results = max_results
+        self.content_tokens = content_tokens
+        self.calls = 0
+
+    async def ainvoke(self, query: str) -> List[Dict[str, str]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency_seconds)
+        slug = "-".join(query.lower().split()[:4])
+        return [
+            {"url": f"https://search.example.com/{slug}/{i}", "content": f"{query}. {filler_text(self.content_tokens, i)}"}
+            for i in range(self.max_results)
+        ]
+
+
+class FakeWikipediaLoader:
+    """Stands in for aload_wikipedia: an async callable returning `load_max_docs` Documents."""
+
+    def __init__(self, latency_seconds: float = 0.8, page_tokens: int = 800):
+        self.latency_seconds = latency_seconds
+        self.page_tokens = page_tokens
+        self.calls = 0
+
+    async def __call__(self, query: str, load_max_docs: int = 3, **kwargs: Any) -> List[Document]:
+        self.calls += 1
+        await asyncio.sleep(self.latency_seconds)
+        slug = "_".join(query.split()[:3]) or "Page"
+        paragraphs = "\n\n".join(filler_text(self.page_tokens // 8, p) for p in range(8))
+        return [
+            Document(
+                page_content=f"{query}\n\n{paragraphs}",
+                metadata={"title": f"{slug} {i}", "summary": query, "source": f"https://en.wikipedia.org/wiki/{slug}_{i}"},
+            ) for i in range(load_max_docs)
+        ]
@@ -0,0 +1,219 @@
+"""End-to-end benchmark of main_research_graph against local stand-ins.
+
+Runs the full pipeline (create_analysts -> interviews -> report) for every combination of
+--analysts and --turns and reports wall time, per-node latency, peak Python heap and stand-in call counts.
+
+    python -m benchmarks.run_benchmark --analysts 1,3,5 --turns 1,2,3
+    python -m benchmarks.run_benchmark --cassette benchmarks/cassettes/demo.json --cassette-mode record   # needs real keys
+    python -m benchmarks.run_benchmark --cassette benchmarks/cassettes/demo.json                          # offline replay
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List
+
+
+def _prepare_environment(args: argparse.Namespace) -> None:
+    # config.py refuses to import without API keys; stand-ins never use them. Must run before any app import.
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "offline-benchmark")
+    data_dir = tempfile.mkdtemp(prefix="research-benchmark-")
+    os.environ["CHECKPOINTER_BACKEND"] = args.checkpointer
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(data_dir, "checkpoints.sqlite")
+    os.environ["THREAD_LOCK_DIR"] = os.path.join(data_dir, "locks")
+    os.environ["SEARCH_CACHE_ENABLED"] = "true" if args.search_cache else "false"
+    os.environ["SEARCH_CACHE_PATH"] = os.path.join(data_dir, "search_cache.sqlite")
+    os.environ["LLM_CACHE_ENABLED"] = "true" if args.llm_cache else "false"
+    os.environ["LLM_CACHE_PATH"] = os.path.join(data_dir, "llm_cache.sqlite")
+    # Fake answers repeat a fixed vocabulary, so novelty-based early stopping is off unless asked for: --turns stays exact
+    os.environ["NOVELTY_STOP_THRESHOLD"] = str(args.novelty_threshold)
+    # Scheduler quotas, to see how close a run gets to a given ceiling
+    for env_var, value in (("LLM_REQUESTS_PER_MINUTE", args.llm_rpm), ("LLM_TOKENS_PER_MINUTE", args.llm_tpm),
+                           ("LLM_MAX_CONCURRENCY", args.llm_concurrency)):
+        if value is not None:
+            os.environ[env_var] = str(value)
+
+
+def _install_stand_ins(args: argparse.Namespace) -> Dict[str, Any]:
+    """Swaps the LLM tiers, the Tavily tool and the Wikipedia fetch used by the graph nodes. Returns them."""
+    import app.api.graph.nodes as nodes
+    from app.api.core.config import model_tiers
+    from benchmarks.cassettes import RECORD, Cassette, CassetteChatModel, CassetteSearch, CassetteWikipedia
+    from benchmarks.fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+
+    if args.cassette:
+        cassette = Cassette(args.cassette, args.cassette_mode)
+        recording = args.cassette_mode == RECORD
+        # One recorder per tier, so a recording goes to the models the routing table picks
+        llms = {
+            tier: CassetteChatModel(cassette=cassette, inner=model if recording else None, cache=model.cache)
+            for tier, model in model_tiers.items()
+        }
+        stand_ins = {
+            "llm": llms["strong"],
+            "tavily_search": CassetteSearch(cassette, nodes.tavily_search if recording else None),
+            "aload_wikipedia": CassetteWikipedia(cassette, nodes.aload_wikipedia if recording else None),
+            "cassette": cassette,
+        }
+    else:
+        stand_ins = {
+            "llm": FakeChatModel(
+                latency_seconds=args.llm_latency,
+                seconds_per_token=args.llm_seconds_per_token,
+                completion_tokens=args.completion_tokens,
+                cache=model_tiers["strong"].cache, # Keep LLM_CACHE_ENABLED meaningful
+            ),
+            "tavily_search": FakeTavilySearch(latency_seconds=args.search_latency, content_tokens=args.search_tokens),
+            "aload_wikipedia": FakeWikipediaLoader(latency_seconds=args.wikipedia_latency, page_tokens=args.wikipedia_tokens),
+        }
+        llms = {tier: stand_ins["llm"] for tier in model_tiers} # One fake serves every tier (and counts all calls)
+    model_tiers.update(llms)
+    nodes.tavily_search = stand_ins["tavily_search"]
+    nodes.aload_wikipedia = stand_ins["aload_wikipedia"]
+    return stand_ins
+
+
+async def _timed_stream(graph, graph_input, config, node_latencies: Dict[str, List[float]]) -> None:
+    """Drives the graph and records task start -> result time for every node, subgraph nodes included."""
+    started: Dict[str, datetime] = {}
+    async for _, event in graph.astream(graph_input, config, stream_mode="debug", subgraphs=True):
+        payload = event.get("payload", {})
+        if event["type"] == "task":
+            started[payload["id"]] = datetime.fromisoformat(event["timestamp"])
+        elif event["type"] == "task_result" and payload["id"] in started:
+            elapsed = datetime.fromisoformat(event["timestamp"]) - started.pop(payload["id"])
+            node_latencies[payload["name"]].append(elapsed.total_seconds())
+
+
+async def run_scenario(topic: str, max_analysts: int, max_turns: int) -> Dict[str, Any]:
+    from app.api.graph.research_graph import main_research_graph as graph
+
+    config = {"configurable": {"thread_id": f"benchmark-{uuid.uuid4()}"}}
+    node_latencies: Dict[str, List[float]] = defaultdict(list)
+    initial_input = {
+        "topic": topic,
+        "max_analysts": max_analysts,
+        "max_num_turns_interview": max_turns,
+        "human_analyst_feedback": None,
+        "document_pool": config["configurable"]["thread_id"],
+        "analysts": [],
+        "sections": [],
+        "introduction": "",
+        "content": "",
+        "conclusion": "",
+        "final_report": "",
+    }
+
+    tracemalloc.reset_peak() # Peak of this scenario only, not of everything the process ran before
+    start = time.perf_counter()
+    await _timed_stream(graph, initial_input, config, node_latencies) # Runs until the human feedback interrupt
+    analysts_ready = time.perf_counter()
+    graph.update_state(config, {"human_analyst_feedback": None}) # Approve analysts unchanged
+    await _timed_stream(graph, None, config, node_latencies)
+    end = time.perf_counter()
+
+    final_state = graph.get_state(config)
+    if final_state.next or not final_state.values.get("final_report"):
+        raise RuntimeError(f"Run did not finish: next={final_state.next}")
+    return {
+        "max_analysts": max_analysts,
+        "max_turns": max_turns,
+        "analysts_seconds": analysts_ready - start,
+        "report_seconds": end - analysts_ready,
+        "wall_seconds": end - start,
+        "node_latencies": dict(node_latencies),
+        "peak_heap_mb": tracemalloc.get_traced_memory()[1] / (1024 * 1024),
+    }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print("\n== Fan-out (wall time per scenario) ==")
+    print(f"{'analysts':>8} {'turns':>5} {'analysts_s':>10} {'report_s':>9} {'wall_s':>8} {'peak_heap_mb':>12}")
+    for r in results:
+        print(f"{r['max_analysts']:>8} {r['max_turns']:>5} {r['analysts_seconds']:>10.2f} {r['report_seconds']:>9.2f} "
+              f"{r['wall_seconds']:>8.2f} {r['peak_heap_mb']:>12.1f}")
+
+    merged: Dict[str, List[float]] = defaultdict(list)
+    for r in results:
+        for node, latencies in r["node_latencies"].items():
+            merged[node].extend(latencies)
+    print("\n== Per-node latency (all scenarios) ==")
+    print(f"{'node':<22} {'count':>6} {'mean_s':>8} {'p95_s':>8} {'total_s':>8}")
+    for node, latencies in sorted(merged.items(), key=lambda item: -sum(item[1])):
+        print(f"{node:<22} {len(latencies):>6} {statistics.mean(latencies):>8.3f} "
+              f"{_percentile(latencies, 95):>8.3f} {sum(latencies):>8.2f}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topic", default="The future of AI in healthcare")
+    parser.add_argument("--analysts", type=_int_list, default=[1, 3, 5], help="Comma-separated max_analysts values")
+    parser.add_argument("--turns", type=_int_list, default=[2], help="Comma-separated max_num_turns values")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per (analysts, turns) combination")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake LLM fixed latency per call (s)")
+    parser.add_argument("--llm-seconds-per-token", type=float, default=0.0005, help="Fake LLM latency per completion token (s)")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="Fake LLM completion size (tokens)")
+    parser.add_argument("--search-latency", type=float, default=0.5, help="Fake Tavily latency (s)")
+    parser.add_argument("--search-tokens", type=int, default=200, help="Fake Tavily content size per result (tokens)")
+    parser.add_argument("--wikipedia-latency", type=float, default=0.8, help="Fake Wikipedia latency (s)")
+    parser.add_argument("--wikipedia-tokens", type=int, default=800, help="Fake Wikipedia page size (tokens)")
+    parser.add_argument("--llm-rpm", type=float, help="LLM requests/min quota for the scheduler (default: config)")
+    parser.add_argument("--llm-tpm", type=float, help="LLM tokens/min quota for the scheduler (default: config)")
+    parser.add_argument("--llm-concurrency", type=int, help="LLM requests in flight at once (default: config)")
+    parser.add_argument("--novelty-threshold", type=float, default=0.0, help="NOVELTY_STOP_THRESHOLD for interviews (default: off)")
+    parser.add_argument("--checkpointer", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--search-cache", action="store_true", help="Enable the search result cache")
+    parser.add_argument("--llm-cache", action="store_true", help="Enable the LLM response cache")
+    parser.add_argument("--cassette", help="Record/replay LLM and search traffic with this JSON cassette instead of fakes")
+    parser.add_argument("--cassette-mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--json", dest="json_path", help="Also write raw results to this file")
+    return parser.parse_args(argv)
+
+async def main(argv=None) -> List[Dict[str, Any]]:
+    args = parse_args(argv)
+    _prepare_environment(args)
+    stand_ins = _install_stand_ins(args)
+
+    results = []
+    # Python allocations, traced so each scenario gets its own peak (ru_maxrss only ever grows within a process)
+    tracemalloc.start()
+    try:
+        for max_analysts in args.analysts:
+            for max_turns in args.turns:
+                for _ in range(args.repeat):
+                    result = await run_scenario(args.topic, max_analysts, max_turns)
+                    results.append(result)
+                    print(f"analysts={max_analysts} turns={max_turns}: {result['wall_seconds']:.2f}s", flush=True)
+    finally:
+        if "cassette" in stand_ins:
+            stand_ins["cassette"].save()
+        tracemalloc.stop()
+
+    print_report(results)
+    calls = {name: getattr(stand_in, "calls", None) for name, stand_in in stand_ins.items() if hasattr(stand_in, "calls")}
+    if calls:
+        print(f"\nStand-in calls: {calls}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
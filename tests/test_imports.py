@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_api_entrypoint_imports(tmp_path):
+    # Fresh interpreter: the import order of `uvicorn app.api.main:app`, not whatever this process loaded first
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "test",
+        "TAVILY_API_KEY": "test",
+        "CHECKPOINT_DB_PATH": str(tmp_path / "checkpoints.sqlite"),
+        "THREAD_LOCK_DIR": str(tmp_path / "locks"),
+        "SEARCH_CACHE_PATH": str(tmp_path / "search_cache.sqlite"),
+        "LLM_CACHE_PATH": str(tmp_path / "llm_cache.sqlite"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.api.main"], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr